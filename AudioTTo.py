@@ -3,17 +3,33 @@ import sys
 import subprocess
 import argparse
 from pydub import AudioSegment
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 import google.genai as genai
-from google.genai import types
+from google.genai import types, errors as genai_errors
+import httpx
 import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 import warnings
 import time
 from typing import List
 from dotenv import load_dotenv
 import threading
+import contextlib
+import contextvars
+import hashlib
+import asyncio
+import random
+import json
+import re
+import glob
+import fnmatch
+import collections
+import math
 from tqdm import tqdm
 import fitz 
+import numpy as np
 
 # --- FIX WINDOWS ENCODING ---
 # Small fix for windows UTF-8 encoding issues
@@ -64,17 +80,90 @@ def configure_ffmpeg():
 
 # Logger Setup
 logger_callback = None
-progress_queue = None
+progress_array = None # Shared memory progress counters, set in the worker processes by init_worker
+progress_generations = None # Owner generation of each counter slot, so stale chunks of a previous job are not counted
+
+# Per-job context: concurrent jobs in the same process each get their own logger, cancel flag and progress callback
+_job_logger = contextvars.ContextVar("job_logger", default=None)
+_job_cancel = contextvars.ContextVar("job_cancel", default=None)
+_job_progress = contextvars.ContextVar("job_progress", default=None)
+_job_trace = contextvars.ContextVar("job_trace", default=None)
+
+class JobCancelled(Exception):
+    """ Raised inside a job once its cancel event is set """
+
+
+class CancelScope:
+    """ Cancel flag of a group of threads: set on its own, or as soon as the parent flag is """
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._event = threading.Event()
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.is_set())
+
 
 def set_logger(callback):
     global logger_callback
     logger_callback = callback
 
+def current_logger():
+    """ The logger of the running job, or the process-wide one set with set_logger """
+    return _job_logger.get() or logger_callback
+
+@contextlib.contextmanager
+def job_context(logger=None, cancel_event=None, progress=None):
+    """
+    Run a job with its own logger callback, cancellation event (threading.Event)
+    and progress callback (receives the structured events of report_progress).
+    """
+    logger_token = _job_logger.set(logger)
+    cancel_token = _job_cancel.set(cancel_event)
+    progress_token = _job_progress.set(progress)
+    try:
+        yield
+    finally:
+        _job_logger.reset(logger_token)
+        _job_cancel.reset(cancel_token)
+        _job_progress.reset(progress_token)
+
+def report_progress(stage: str, done: float, total: float, elapsed: float):
+    """ Structured progress event for the job: percent, real-time factor (audio sec per wall sec) and ETA """
+    callback = _job_progress.get()
+    if not callback:
+        return
+    rtf = done / elapsed if elapsed > 0 else 0.0
+    callback({
+        "stage": stage,
+        "done": round(done, 1),
+        "total": round(total, 1),
+        "percent": round(min(100.0, 100.0 * done / total), 1) if total else 0.0,
+        "rtf": round(rtf, 2),
+        "eta_sec": round((total - done) / rtf, 1) if rtf > 0 and total > done else 0.0,
+        "elapsed_sec": round(elapsed, 1)
+    })
+
+def check_cancelled():
+    """ Stop the current job (raises JobCancelled) if it has been cancelled """
+    event = _job_cancel.get()
+    if event is not None and event.is_set():
+        raise JobCancelled()
+
+def start_thread(target, *args) -> threading.Thread:
+    """ Start a thread that inherits the job context (logger, cancellation) """
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target, *args))
+    thread.start()
+    return thread
+
 def log(*args, **kwargs):
     """ Log a message to the console or to the logger callback, usefull for user interactions """
     msg = " ".join(map(str, args))
-    if logger_callback:
-        logger_callback(msg)
+    callback = current_logger()
+    if callback:
+        callback(msg)
     else:
         print(msg, flush=True, **kwargs)
 
@@ -82,13 +171,19 @@ class ProgressLogger:
     """ Custom logger for progress output """
     def write(self, buf):
         if buf.strip():
-            if logger_callback:
-                logger_callback(buf)
+            progress = _job_progress.get()
+            if progress:
+                # Bars are redrawn many times a second: hand them over as progress so they get coalesced
+                progress({"bar": buf.strip()})
+                return
+            callback = current_logger()
+            if callback:
+                callback(buf)
             else:
                 sys.stderr.write(buf)
                 sys.stderr.flush()
     def flush(self):
-        if not logger_callback:
+        if not current_logger():
             sys.stderr.flush()
 
 warnings.filterwarnings("ignore", category=UserWarning, module='ctranslate2')
@@ -104,24 +199,597 @@ MODEL_SIZE = "small"
 COMPUTE_TYPE = "int8"
 LANGUAGE = None  
 N_THREADS = 4
+CPU_THREADS = int(os.getenv("CPU_THREADS", "0")) # CTranslate2 threads per worker (0 = auto)
+CALIBRATION_CLIP_SEC = 30
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+TRANSCRIPT_CACHE_MB = int(os.getenv("TRANSCRIPT_CACHE_MB", "200"))
+LLM_CACHE_MB = int(os.getenv("LLM_CACHE_MB", "100"))
+SLIDE_CACHE_MB = int(os.getenv("SLIDE_CACHE_MB", "200"))
+SLIDES_MODE = os.getenv("SLIDES_MODE", "pdf")
+DIGEST_MIN_TEXT_CHARS = 40 # Pages with less text than this are rendered as images
+DIGEST_IMAGE_COVERAGE = 0.4 # ...and so are pages whose images cover this share of the page
+DIGEST_MAX_DRAWINGS = 150 # ...or with this many vector paths (diagrams, plots)
+DIGEST_MAX_PX = 1024 # Longest side of a rendered page
+DIGEST_JPEG_QUALITY = 70
+DIGEST_AUTO_RATIO = 0.5 # 'auto' sends the digest when it is at most this fraction of the PDF size
+GEMINI_FILE_TTL_MARGIN_SEC = 3600 # Stop reusing an uploaded file this long before Gemini deletes it
+SECTION_WORDS = int(os.getenv("SECTION_WORDS", "3500")) # ~25 minutes of speech per sectioned request
+SECTION_SLIDE_MARGIN = 2 # Slides attached before and after the share of the deck matching a section
+JOB_MANIFEST = "job_manifest.json"
 CHUNK_LENGTH_MS_LOCAL = 10 * 60 * 1000
+SAMPLE_RATE = 16000
+STREAM_IN_FLIGHT_PER_WORKER = 2
+STREAM_READ_SEC = 30
+FFMPEG_STDERR_LINES = 20 # Decoder error lines kept for the log
+# Containers ffmpeg can demux from a pipe (no trailing index), used for transcoding during uploads
+STREAMABLE_AUDIO = (".mp3", ".wav", ".ogg", ".oga", ".opus", ".flac", ".aac", ".webm", ".mka")
+# Files picked up when a directory is given in batch mode
+AUDIO_EXTENSIONS = STREAMABLE_AUDIO + (".m4a", ".mp4", ".wma", ".aiff", ".mov", ".mkv")
+BATCH_JOBS = int(os.getenv("BATCH_JOBS", "2")) # Files in flight in batch mode (one transcribes, the others are in Gemini/pdflatex)
+BATCH_PROGRESS_STEP = 10 # Batch mode logs transcription progress every this many percent
+CHUNK_OVERLAP_SEC = 1.5
+BOUNDARY_SEARCH_SEC = 20
+RMS_FRAME_SEC = 0.03
+SEAM_WORDS_PER_SEC = 3.5 # Fast speech: the overlap cannot repeat more words than overlap x this
+SEAM_MIN_WORDS = 2
+SEAM_MAX_SKIP = 2
+SEAM_SKIP_MIN_WORDS = 3 # A match that drops skipped (cut-off) words must be at least this long
+SEAM_CONTENT_CHARS = 4 # A shorter match needs a word this long: "of the", "in the" prove nothing
+MAX_CHUNK_RETRIES = 2
+UNITS_PER_WORKER = 4
+MIN_UNIT_SEC = 60
+MAX_UNIT_SEC = CHUNK_LENGTH_MS_LOCAL / 1000
+POOL_HEALTH_TIMEOUT = 600
+PROGRESS_SLOTS = 64 # Concurrent jobs that can report progress from the worker processes
+PROGRESS_SAMPLE_SEC = 0.5
+STAGE_STOP_TIMEOUT_SEC = 30 # Wait for running stages to stop after a failure or cancel
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "") # Spans to run under cProfile: comma separated names or 'all'
+METRIC_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600) # Histogram bounds in seconds
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") # e.g. a local fake endpoint for tests
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10")) # Requests per minute shared by all jobs
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "3"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_SEC = 2.0
+GEMINI_BACKOFF_MAX_SEC = 60.0
+GEMINI_TIMEOUT_SEC = float(os.getenv("GEMINI_TIMEOUT_SEC", "600"))
+GEMINI_RETRY_CODES = (408, 429, 500, 502, 503, 504)
+LATEX_TIMEOUT_SEC = float(os.getenv("LATEX_TIMEOUT_SEC", "120")) # A single pdflatex run is killed after this
+LATEX_MAX_RUNS = 3
+LATEX_JOBS = int(os.getenv("LATEX_JOBS", "2")) # Concurrent pdflatex processes (shared by all jobs)
+LATEX_AUX_EXTS = (".aux", ".toc", ".lof", ".lot", ".out")
+REPAIR_ROUNDS = 2 # Compile/repair cycles of the fast review before the full review
+REPAIR_CONTEXT_LINES = 3
+REPAIR_MAX_LINES = 60
+STREAM_PROGRESS_SEC = 2.0 # Minimum interval between streaming progress messages
+STREAM_VALIDATE_CHARS = 2000 # Text received before a missing \documentclass is reported
 model = "gemini-3-flash-preview"
 model_worker = None
 
-def init_worker(queue=None):
-    """ Initialize the Whisper model worker """
-    global model_worker, progress_queue
-    model_worker = WhisperModel(MODEL_SIZE, device="cpu", compute_type=COMPUTE_TYPE)
-    if queue:
-        progress_queue = queue
+def init_worker(progress=None, cpu_threads=0, generations=None):
+    """ Initialize the Whisper model worker (progress/generations: the pool's shared progress arrays) """
+    global model_worker, progress_array, progress_generations
+    model_worker = WhisperModel(MODEL_SIZE, device="cpu", compute_type=COMPUTE_TYPE, cpu_threads=cpu_threads)
+    progress_array = progress
+    progress_generations = generations
+
+
+# ---------------- CPU TOPOLOGY ----------------
+def physical_core_count() -> int:
+    """ Number of physical cores (hyper-threads share the SIMD units CTranslate2 saturates) """
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except ImportError:
+        pass
+
+    try:
+        cores = set()
+        physical_id = None
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    cores.add((physical_id, line.split(":")[1].strip()))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+
+    return os.cpu_count() or 1
+
+
+def resolve_topology(threads: int, cpu_threads: int = None) -> tuple:
+    """
+    Split a thread budget into (worker processes, CTranslate2 threads per worker).
+    The budget is capped at the physical cores so processes x threads never oversubscribes them.
+    cpu_threads comes from the argument, then the calibrated CPU_THREADS, then a heuristic:
+    one thread per process on small budgets, two otherwise.
+    """
+    budget = max(1, min(threads, physical_core_count()))
+    per_worker = cpu_threads or CPU_THREADS or (1 if budget < 4 else 2)
+    per_worker = max(1, min(per_worker, budget))
+    return max(1, budget // per_worker), per_worker
+
+
+def topology_info(threads: int) -> dict:
+    processes, cpu_threads = resolve_topology(threads)
+    return {
+        "physical_cores": physical_core_count(),
+        "processes": processes,
+        "cpu_threads": cpu_threads,
+        "source": "calibrated" if CPU_THREADS else "auto"
+    }
+
+
+def synthetic_speech(duration_sec: float, seed: int = 0) -> np.ndarray:
+    """ Speech-like test signal: voiced harmonics, syllable-rate envelope and pauses """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.6)
+    noise = rng.standard_normal(len(t)) * 0.02
+    return (0.3 * voiced * envelope + noise).astype(np.float32)
+
+
+def save_env_values(values: dict, env_path: str = ".env"):
+    """ Create or update KEY=value lines in the .env file """
+    lines = []
+    if os.path.exists(env_path):
+        with open(env_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+
+    pending = dict(values)
+    out = []
+    for l in lines:
+        key = l.split("=", 1)[0].strip()
+        if key in pending:
+            out.append(f"{key}={pending.pop(key)}\n")
+        else:
+            out.append(l)
+    for key, value in pending.items():
+        out.append(f"{key}={value}\n")
+
+    with open(env_path, "w", encoding="utf-8") as f:
+        f.writelines(out)
+    for key, value in values.items():
+        os.environ[key] = str(value)
+
+
+def calibrate_topology(threads: int, clip_sec: float = CALIBRATION_CLIP_SEC, persist: bool = True) -> dict:
+    """
+    Measure the real-time factor of a few processes x threads layouts on a synthetic clip.
+    Every worker transcribes one clip at the same time, model loading is excluded.
+    The best cpu_threads is saved to .env (CPU_THREADS) when persist is set.
+    """
+    global CPU_THREADS
+    budget = max(1, min(threads, physical_core_count()))
+    log(f"⏱️ Calibrating CPU topology ({budget} cores, {clip_sec:.0f}s clip)...")
+
+    clip = synthetic_speech(clip_sec)
+    layouts = []
+    for per_worker in sorted({min(t, budget) for t in (1, 2, 4, budget)}):
+        processes = max(1, budget // per_worker)
+        pool = TranscriptionPool(processes, per_worker)
+        try:
+            pool.warm_up()
+            start = time.time()
+            futures = [pool.submit(transcribe_chunk_worker, clip) for _ in range(processes)]
+            for future in futures:
+                future.result()
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+
+        rtf = elapsed / (processes * clip_sec)
+        layouts.append({"processes": processes, "cpu_threads": per_worker, "rtf": round(rtf, 4)})
+        log(f"   - {processes} x {per_worker} threads: RTF {rtf:.3f}")
+
+    best = min(layouts, key=lambda l: l["rtf"])
+    log(f"✔️ Best layout: {best['processes']} processes x {best['cpu_threads']} threads.")
+    if persist:
+        save_env_values({"CPU_THREADS": best["cpu_threads"]})
+        CPU_THREADS = best["cpu_threads"]
+
+    return {"budget": budget, "best": best, "layouts": layouts}
+
+
+# ---------------- INSTRUMENTATION ----------------
+class Metrics:
+    """
+    Process-wide counters and histograms (label sets as keyword arguments),
+    rendered in the Prometheus text format by gui_app's /metrics route.
+    """
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist["counts"][i] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+    def render(self) -> str:
+        def labels_text(labels, extra=()):
+            pairs = [f'{k}="{v}"' for k, v in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{labels_text(labels)} {value:g}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(self.buckets, hist["counts"]):
+                        lines.append(f"{name}_bucket{labels_text(labels, [('le', f'{bound:g}')])} {count}")
+                    lines.append(f"{name}_bucket{labels_text(labels, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"{name}_sum{labels_text(labels)} {hist['sum']:.6f}")
+                    lines.append(f"{name}_count{labels_text(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+metrics = Metrics()
+
+
+class JobTrace:
+    """ Timing records (spans) of one job, written next to its notes as <name>_timings.json """
+    def __init__(self, output_dir: str = None, profile: str = None):
+        self.output_dir = output_dir
+        self.profile = profile
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def summary(self) -> dict:
+        """ Total seconds and count per span name """
+        totals = {}
+        with self._lock:
+            for record in self.spans:
+                entry = totals.setdefault(record["name"], {"count": 0, "seconds": 0.0})
+                entry["count"] += 1
+                entry["seconds"] = round(entry["seconds"] + record["seconds"], 3)
+        return totals
+
+    def save(self, path: str):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda r: r["start"])
+        data = {"started": self.started, "total_sec": round(time.time() - self.started, 3),
+                "summary": self.summary(), "spans": spans}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+def record_span(name: str, seconds: float, ok: bool = True, start: float = None, **attrs):
+    """ Record an already measured span: job timing record (if a trace is active) plus the process metrics """
+    metrics.observe("audiotto_span_seconds", seconds, span=name)
+    if not ok:
+        metrics.inc("audiotto_span_errors_total", span=name)
+    trace = _job_trace.get()
+    if trace is not None:
+        start = start if start is not None else time.time() - seconds
+        trace.add({"name": name, "start": round(start - trace.started, 3), "seconds": round(seconds, 3),
+                   "ok": ok, "thread": threading.current_thread().name, **attrs})
+
+
+_profile_lock = threading.Lock()
+
+def _profiled(name: str) -> bool:
+    """ The job's --profile list if it has one, otherwise PROFILE_STAGES """
+    trace = _job_trace.get()
+    spec = trace.profile if trace is not None and trace.profile is not None else PROFILE_STAGES
+    wanted = {s.strip() for s in spec.split(",") if s.strip()}
+    return bool(wanted) and ("all" in wanted or name in wanted)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block as a named span. Spans selected for profiling (--profile / PROFILE_STAGES) also run under cProfile and
+    dump <output_dir>/profile_<name>.prof (one profiled span at a time, the profiler is per process).
+    """
+    profiler = None
+    if _profiled(name) and _profile_lock.acquire(blocking=False):
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. an outer cProfile run) is already active
+            profiler = None
+            _profile_lock.release()
+
+    start, wall = time.perf_counter(), time.time()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            trace = _job_trace.get()
+            path = os.path.join(trace.output_dir if trace and trace.output_dir else ".", f"profile_{name}.prof")
+            profiler.dump_stats(path)
+            log(f"📊 Profile of '{name}' saved at: {path}")
+        record_span(name, seconds, ok=ok, start=wall, **attrs)
+
+
+# ---------------- CACHE ----------------
+class DiskCache:
+    """
+    Size-bounded on-disk cache of JSON records, one file per key.
+    Reads refresh the file mtime, so eviction removes the least recently used entries first.
+    """
+    def __init__(self, directory: str, max_bytes: int, ext: str = ".json"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ext = ext
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.ext}")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.evict()
+
+    def get_file(self, key: str):
+        """ Path of a stored file entry (see put_file), or None """
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+
+    def put_file(self, key: str, write) -> str:
+        """ Store a file entry: write(tmp_path) creates it, then it is moved in place atomically """
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """ Delete the least recently used entries until the cache fits in max_bytes """
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(self.ext):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                    entries.append((st.st_mtime, st.st_size, name))
+                except OSError:
+                    pass
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                except OSError:
+                    pass
+
+
+def hash_file(path: str) -> str:
+    """ SHA-256 of the file content """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_key(*parts) -> str:
+    return hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+transcript_cache = None
+
+def get_transcript_cache() -> DiskCache:
+    global transcript_cache
+    if transcript_cache is None:
+        transcript_cache = DiskCache(os.path.join(CACHE_DIR, "transcripts"), TRANSCRIPT_CACHE_MB * 1024 * 1024)
+    return transcript_cache
+
+
+def transcript_cache_key(audio_path: str) -> str:
+    """ Audio content + everything that changes the Whisper output """
+    return hash_key("transcript", hash_file(audio_path), MODEL_SIZE, COMPUTE_TYPE, LANGUAGE)
+
+
+slide_cache = None
+gemini_file_cache = None
+
+def get_slide_cache() -> DiskCache:
+    global slide_cache
+    if slide_cache is None:
+        slide_cache = DiskCache(os.path.join(CACHE_DIR, "slides"), SLIDE_CACHE_MB * 1024 * 1024, ext=".pdf")
+    return slide_cache
+
+
+def get_gemini_file_cache() -> DiskCache:
+    global gemini_file_cache
+    if gemini_file_cache is None:
+        gemini_file_cache = DiskCache(os.path.join(CACHE_DIR, "gemini_files"), 1024 * 1024)
+    return gemini_file_cache
+
+
+_hash_memo = {}
+
+def hash_file_cached(path: str) -> str:
+    """ hash_file memoized on (path, size, mtime), so an unchanged deck is read only once per process """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        _hash_memo[memo_key] = hash_file(path)
+    return _hash_memo[memo_key]
+
+
+llm_cache = None
+
+def get_llm_cache() -> DiskCache:
+    global llm_cache
+    if llm_cache is None:
+        llm_cache = DiskCache(os.path.join(CACHE_DIR, "llm"), LLM_CACHE_MB * 1024 * 1024)
+    return llm_cache
+
+
+def llm_cache_key(kind: str, prompt: str, slides_path: str = None) -> str:
+    """ Model + full prompt text + content of the attached slides """
+    slides_hash = hash_file_cached(slides_path) if slides_path else ""
+    return hash_key("llm", kind, model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), slides_hash)
+
+
+# ---------------- JOB MANIFEST ----------------
+class JobManifest:
+    """
+    Checkpoint of a job, kept in its output folder.
+    Records the settings that determine the chunk plan, every finished chunk (text + language)
+    and the completed pipeline stages, so an interrupted job can be resumed with --resume.
+    """
+    def __init__(self, path: str, data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, path: str, args) -> "JobManifest":
+        manifest = cls(path, {
+            "audio": os.path.abspath(args.file_audio),
+            "args": {"slides": args.slides, "pages": args.pages, "threads": args.threads, "engine": args.engine},
+            "model": [MODEL_SIZE, COMPUTE_TYPE, LANGUAGE],
+            "ingest": args.ingest,
+            "overlap": args.overlap,
+            "chunk_sec": None,
+            "chunks": {},
+            "stages": {},
+            "updated": time.time()
+        })
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def matches(self, args) -> bool:
+        """ The checkpoint is only valid for the same recording and Whisper settings """
+        return (os.path.basename(self.data.get("audio", "")) == os.path.basename(args.file_audio)
+                and self.data.get("model") == [MODEL_SIZE, COMPUTE_TYPE, LANGUAGE])
+
+    def save(self):
+        self.data["updated"] = time.time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def record_chunk(self, index: int, text: str, language: str):
+        with self._lock:
+            self.data["chunks"][str(index)] = {"text": text, "language": language}
+            self.save()
+
+    def completed_chunks(self) -> dict:
+        return {int(i): (c["text"], c["language"]) for i, c in self.data["chunks"].items()}
+
+    def mark_stage(self, name: str, **info):
+        with self._lock:
+            self.data["stages"][name] = {"time": time.time(), **info}
+            self.save()
+
+    def stage(self, name: str):
+        return self.data["stages"].get(name)
 
 
 # ---------------- SLIDES PROCESSING ----------------
+def parse_page_ranges(pages_range: str, page_count: int) -> list:
+    """
+    Parse a page selection like "1-5,9,12-14" (1-based, open ranges "5-" and "-3" allowed)
+    into 0-based page indexes, in the given order and without duplicates.
+    """
+    pages = []
+    for part in pages_range.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            start = int(first) if first.strip() else 1
+            end = int(last) if last.strip() else page_count
+        else:
+            start = end = int(part)
+        start, end = max(1, start), min(page_count, end)
+        if start > end:
+            raise ValueError(f"empty range '{part}'")
+        pages.extend(p - 1 for p in range(start, end + 1) if p - 1 not in pages)
+    if not pages:
+        raise ValueError("no pages selected")
+    return pages
+
+
 def process_slides(slides_path: str, pages_range: str = None) -> any:
     """
     Checks if PDF exists and handles page slicing if a range is provided.
-    Returns the path to the file to uplad (original or temporary sliced).
+    Returns the path to the file to uplad (original or sliced copy in the slide cache).
     """
     if not slides_path or not os.path.exists(slides_path):
         log("⚠️  Slides path not provided or does not exist.")
@@ -134,38 +802,36 @@ def process_slides(slides_path: str, pages_range: str = None) -> any:
 
     # Handle page slicing
     try:
-        log(f"✂️  Extracting page range: {pages_range}")
-        doc = fitz.open(slides_path)
-        
-        # Parse range (e.g., "1-5")
-        start_page, end_page = 0, len(doc) - 1
-        parts = pages_range.split('-')
-        if len(parts) >= 1 and parts[0].strip():
-            start_page = int(parts[0]) - 1
-        if len(parts) >= 2 and parts[1].strip():
-            end_page = int(parts[1]) - 1
-        
-        # Validate bounds
-        start_page = max(0, start_page)
-        end_page = min(len(doc) - 1, end_page)
+        log(f"✂️  Extracting pages: {pages_range}")
+
+        # Same deck + same selection: reuse the slice from the cache
+        source_hash = hash_file_cached(slides_path)
+        cache_key = hash_key("slides", source_hash, pages_range.replace(" ", ""))
+        cached = get_slide_cache().get_file(cache_key)
+        if cached:
+            log("   - Sliced PDF found in cache.")
+            return cached
 
-        if start_page > end_page:
-            log(f"⚠️ Invalid range {start_page+1}-{end_page+1}. Using full PDF.")
+        doc = fitz.open(slides_path)
+        try:
+            pages = parse_page_ranges(pages_range, len(doc))
+        except ValueError as e:
+            log(f"⚠️ Invalid page selection '{pages_range}' ({e}). Using full PDF.")
             doc.close()
             return slides_path
 
         # Create new PDF with selected pages
-        output_dir = os.path.dirname(slides_path) or "."
-        base_name = os.path.splitext(os.path.basename(slides_path))[0]
-        sliced_path = os.path.join(output_dir, f"{base_name}_pages_{start_page+1}-{end_page+1}.pdf")
-        
-        new_doc = fitz.open()
-        new_doc.insert_pdf(doc, from_page=start_page, to_page=end_page)
-        new_doc.save(sliced_path)
-        new_doc.close()
+        def write_slice(path):
+            new_doc = fitz.open()
+            for page in pages:
+                new_doc.insert_pdf(doc, from_page=page, to_page=page)
+            new_doc.save(path)
+            new_doc.close()
+
+        sliced_path = get_slide_cache().put_file(cache_key, write_slice)
         doc.close()
         
-        print(f"   - Created temporary sliced PDF: {sliced_path}")
+        log(f"   - Created sliced PDF ({len(pages)} pages): {sliced_path}")
         return sliced_path
 
     except Exception as e:
@@ -173,16 +839,338 @@ def process_slides(slides_path: str, pages_range: str = None) -> any:
         return slides_path
 
 
+class SlideDigest:
+    """ Compact stand-in for the PDF: the text of every slide plus renders of the visual ones """
+
+    def __init__(self, blocks: list, images: list, pdf_bytes: int):
+        self.blocks = blocks # Text of each slide, in page order
+        self.text = "\n\n".join(blocks)
+        self.images = images
+        self.pdf_bytes = pdf_bytes
+
+    @property
+    def pages(self) -> int:
+        return len(self.blocks)
+
+    def slice(self, first: int, last: int) -> "SlideDigest":
+        """ Digest of slides first..last only (1-based, inclusive) """
+        images = [(page, img) for page, img in self.images if first <= page <= last]
+        return SlideDigest(self.blocks[first - 1:last], images, self.pdf_bytes)
+
+    @property
+    def payload_bytes(self) -> int:
+        return len(self.text.encode("utf-8")) + sum(len(img) for _, img in self.images)
+
+    def parts(self) -> list:
+        parts = [self.text]
+        for page, img in self.images:
+            parts += [f"Render of slide {page}:", types.Part.from_bytes(data=img, mime_type="image/jpeg")]
+        return parts
+
+
+def page_is_visual(page, text: str) -> bool:
+    """ Little text, large images or many vector paths: the slide needs to be seen, not read """
+    if len(text) < DIGEST_MIN_TEXT_CHARS:
+        return True
+    area = abs(page.rect) or 1
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    if covered / area >= DIGEST_IMAGE_COVERAGE:
+        return True
+    return len(page.get_drawings()) >= DIGEST_MAX_DRAWINGS
+
+
+def build_slide_digest(slides_path: str) -> SlideDigest:
+    """ Extract the slide text locally with fitz, rasterizing only the visual pages at a capped resolution """
+    doc = fitz.open(slides_path)
+    blocks, images = [], []
+    for i, page in enumerate(doc):
+        text = page.get_text("text").strip()
+        blocks.append(f"--- Slide {i + 1} ---\n{text}")
+        if page_is_visual(page, text):
+            zoom = min(2.0, DIGEST_MAX_PX / max(page.rect.width, page.rect.height))
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            images.append((i + 1, pix.tobytes("jpg", jpg_quality=DIGEST_JPEG_QUALITY)))
+            blocks[-1] += "\n[see the render of this slide]"
+    doc.close()
+
+    digest = SlideDigest(blocks, images, os.path.getsize(slides_path))
+    text_kb = len(digest.text.encode("utf-8")) / 1024
+    images_kb = sum(len(img) for _, img in images) / 1024
+    log(f"📉 Slide digest: {digest.payload_bytes / 1024:.0f} KB (text {text_kb:.0f} KB + {len(images)} renders {images_kb:.0f} KB) "
+        f"instead of the {digest.pdf_bytes / 1024:.0f} KB PDF")
+    return digest
+
+
+# ---------------- CHUNK PLANNING ----------------
+def frame_rms(pcm: np.ndarray, frame_len: int) -> np.ndarray:
+    """ Vectorized RMS energy of consecutive, non-overlapping frames """
+    n_frames = len(pcm) // frame_len
+    frames = pcm[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def find_silence_boundary(pcm: np.ndarray, target: int, search: int, rate: int = SAMPLE_RATE) -> int:
+    """
+    Return the sample index of the quietest frame within +/- search samples of target.
+    Ties (e.g. a long pause) are resolved towards the target so chunk lengths stay close to the plan.
+    """
+    frame_len = max(1, int(RMS_FRAME_SEC * rate))
+    lo = max(0, target - search)
+    hi = min(len(pcm), target + search)
+    if hi - lo < 2 * frame_len:
+        return min(target, len(pcm))
+
+    rms = frame_rms(pcm[lo:hi], frame_len)
+    centers = lo + np.arange(len(rms)) * frame_len + frame_len // 2
+    distance = np.abs(centers - target) / max(1, search)
+    best = int(np.argmin(rms * (1.0 + 0.1 * distance) + 1e-9 * distance))
+    return int(centers[best])
+
+
+def plan_chunk_boundaries(pcm: np.ndarray, chunk_len: int, search: int, rate: int = SAMPLE_RATE) -> list:
+    """ Return the cut points (sample indices) that split pcm into chunks of about chunk_len samples """
+    cuts = []
+    pos = 0
+    while len(pcm) - pos > chunk_len + search:
+        cut = find_silence_boundary(pcm, pos + chunk_len, search, rate)
+        cut = max(cut, pos + 1)
+        cuts.append(cut)
+        pos = cut
+    return cuts
+
+
+def plan_unit_seconds(total_sec: float, num_workers: int) -> float:
+    """
+    Size the work units so every worker receives about UNITS_PER_WORKER of them.
+    Small units keep all cores busy until the end (no single long tail chunk),
+    MIN_UNIT_SEC bounds the per-unit overhead (language detection, decoder warm-up).
+    """
+    if total_sec <= 0:
+        return MAX_UNIT_SEC
+    unit = total_sec / (max(1, num_workers) * UNITS_PER_WORKER)
+    return float(min(MAX_UNIT_SEC, max(MIN_UNIT_SEC, unit)))
+
+
+def plan_stream_chunks(windows, chunk_sec: float, overlap_sec: float = CHUNK_OVERLAP_SEC, search_sec: float = BOUNDARY_SEARCH_SEC):
+    """
+    Regroup decoded PCM windows into chunks that end in low-energy regions.
+    Each chunk is prefixed with the last overlap_sec of the previous one,
+    the repeated words are removed afterwards by merge_chunk_texts.
+    """
+    chunk_len = int(chunk_sec * SAMPLE_RATE)
+    search = min(int(search_sec * SAMPLE_RATE), chunk_len // 2)
+    overlap = int(overlap_sec * SAMPLE_RATE)
+
+    parts = []
+    buffered = 0
+    carry = np.zeros(0, dtype=np.float32)
+
+    for window in windows:
+        parts.append(window)
+        buffered += len(window)
+        if buffered < chunk_len + search:
+            continue
+
+        buf = np.concatenate(parts)
+        pos = 0
+        while len(buf) - pos >= chunk_len + search:
+            cut = max(find_silence_boundary(buf, pos + chunk_len, search), pos + 1)
+            yield np.concatenate([carry, buf[pos:cut]])
+            carry = buf[max(pos, cut - overlap):cut].copy()
+            pos = cut
+
+        parts = [buf[pos:].copy()]
+        buffered = len(parts[0])
+
+    if buffered:
+        yield np.concatenate([carry] + parts)
+
+
+def _seam_word(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_chunk_texts(texts: list, overlap_sec: float = CHUNK_OVERLAP_SEC) -> str:
+    """
+    Join the chunk transcripts, dropping the words repeated at each seam because of the overlap.
+    Only the words the overlap can hold are searched, and up to SEAM_MAX_SKIP cut-off words
+    on either side of the seam are tolerated when the match is long enough to be trusted.
+    Cuts are planned in silence, so a seam often repeats nothing: then both texts are kept whole.
+    """
+    window = max(SEAM_MIN_WORDS, math.ceil(overlap_sec * SEAM_WORDS_PER_SEC))
+    merged = []
+    for text in texts:
+        words = text.split()
+        if merged and words:
+            tail = [_seam_word(w) for w in merged[-(window + SEAM_MAX_SKIP):]]
+            head = [_seam_word(w) for w in words[:window + SEAM_MAX_SKIP]]
+            drop_tail, drop_head = _find_seam(tail, head, window)
+            if drop_tail:
+                del merged[-drop_tail:]
+            words = words[drop_head:]
+        merged.extend(words)
+    return " ".join(merged)
+
+
+def _find_seam(tail: list, head: list, window: int) -> tuple:
+    """ Return (words to drop from the end of tail, words to drop from the start of head) """
+    for k in range(min(window, len(tail), len(head)), SEAM_MIN_WORDS - 1, -1):
+        needle_ok = k >= SEAM_SKIP_MIN_WORDS
+        max_skip = SEAM_MAX_SKIP if needle_ok else 0 # Short matches may not drop anything but themselves
+        for tail_skip in range(max_skip + 1):
+            end = len(tail) - tail_skip
+            if end - k < 0:
+                break
+            needle = tail[end - k:end]
+            if not needle_ok and not any(len(w) >= SEAM_CONTENT_CHARS for w in needle):
+                continue
+            for head_skip in range(max_skip + 1):
+                if head[head_skip:head_skip + k] == needle:
+                    return tail_skip, head_skip + k
+    return 0, 0
+
+
 # ---------------- AUDIO FUNCTIONS ----------------
-def create_output_folder(audio_path: str) -> str:
-    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+def create_output_folder(audio_path: str, name: str = None) -> str:
+    base_name = name or os.path.splitext(os.path.basename(audio_path))[0]
     output_dir = os.path.join("output", base_name)
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
 
 
-def split_audio(audio_path: str, chunk_len_ms: int, output_dir: str) -> list:
-    log(f"🔪 Splitting audio into {chunk_len_ms // 60000}-minute chunks...")
+def probe_duration(audio_path: str) -> float:
+    """ Return the duration of the audio in seconds using ffprobe (0.0 if unknown) """
+    ffprobe = getattr(AudioSegment, "ffprobe", None) or "ffprobe"
+    cmd = [
+        ffprobe,
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        audio_path
+    ]
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return float(result.stdout.strip())
+    except Exception:
+        return 0.0
+
+
+def decode_audio_stream(audio_path: str, window_sec: float):
+    """
+    Decode the audio with ffmpeg straight into memory.
+    Yields fixed-size float32 windows of 16kHz mono PCM, the format expected by Whisper.
+    No temporary file is written and only one window is held by the decoder at a time.
+    Consume it under contextlib.closing: a consumer that stops early (cancel, worker error) must stop ffmpeg
+    right away, not whenever the garbage collector reaches the generator (on another job's thread).
+    """
+    cmd = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-v", "error",
+        "-i", audio_path,
+        "-f", "s16le", # Raw 16-bit PCM
+        "-ac", "1", # Mono
+        "-ar", str(SAMPLE_RATE), # 16kHz (optimal for Whisper)
+        "pipe:1"
+    ]
+    window_bytes = int(window_sec * SAMPLE_RATE) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Drain stderr while decoding: a damaged file can print more errors than the pipe buffer holds,
+    # and a blocked ffmpeg would stop writing PCM. Only the last lines are kept for the report.
+    err_tail = collections.deque(maxlen=FFMPEG_STDERR_LINES)
+    err_thread = threading.Thread(target=lambda: err_tail.extend(proc.stderr), daemon=True)
+    err_thread.start()
+
+    finished = False
+    try:
+        while True:
+            buf = bytearray()
+            while len(buf) < window_bytes:
+                data = proc.stdout.read(window_bytes - len(buf))
+                if not data:
+                    break
+                buf.extend(data)
+            if len(buf) < 2:
+                break
+            # Drop a trailing odd byte, if any, before reinterpreting as int16
+            buf = buf[:len(buf) - (len(buf) % 2)]
+            yield np.frombuffer(buf, dtype=np.int16).astype(np.float32) / 32768.0
+            if len(buf) < window_bytes:
+                break
+        finished = True
+    finally:
+        # Stopped early: kill ffmpeg before closing its pipes, so it never dies on a broken pipe mid-write
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        proc.stdout.close()
+        err_thread.join(timeout=5)
+        proc.stderr.close()
+        err = [line.decode("utf-8", errors="replace").strip() for line in err_tail]
+        err = [line for line in err if line]
+        # An intentional stop is not a decoder error
+        if finished and proc.returncode != 0 and err:
+            log(f"⚠️ FFmpeg decoder reported: {err[-1]}")
+
+
+class StreamTranscoder:
+    """
+    Transcode audio to 16kHz mono WAV while its bytes are still arriving (e.g. during an upload).
+    Only containers that can be demuxed from a pipe are supported, see STREAMABLE_AUDIO.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.failed = False
+        cmd = [
+            AudioSegment.converter,
+            "-y",
+            "-hide_banner",
+            "-v", "error",
+            "-i", "pipe:0",
+            "-ac", "1", # Mono
+            "-ar", str(SAMPLE_RATE), # 16kHz (optimal for Whisper)
+            output_path
+        ]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @staticmethod
+    def supports(filename: str) -> bool:
+        return os.path.splitext(filename)[1].lower() in STREAMABLE_AUDIO
+
+    def feed(self, data: bytes):
+        if self.failed:
+            return
+        try:
+            self.proc.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            self.failed = True
+
+    def finish(self, timeout: float = 600) -> bool:
+        """ Close the input and wait for ffmpeg. True if the WAV is complete. """
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+            self.failed = True
+        ok = not self.failed and self.proc.returncode == 0 and os.path.exists(self.output_path)
+        if not ok and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        return ok
+
+    def abort(self):
+        self.failed = True
+        self.finish(timeout=5)
+
+
+def split_audio(audio_path: str, chunk_len_ms: int, output_dir: str, overlap_ms: int = int(CHUNK_OVERLAP_SEC * 1000)) -> list:
+    log(f"🔪 Splitting audio into ~{chunk_len_ms / 60000:g}-minute chunks at silent points...")
     
     temp_wav = os.path.join(output_dir, "temp_conversion.wav")
     
@@ -215,10 +1203,19 @@ def split_audio(audio_path: str, chunk_len_ms: int, output_dir: str) -> list:
         log(f"⚠️ Error loading audio: {e}. Trying callback...")
         audio = AudioSegment.from_file(audio_path)
 
+    # Plan boundaries on the mono samples, then convert them back to milliseconds
+    mono = audio.set_channels(1) if audio.channels > 1 else audio
+    pcm = np.array(mono.get_array_of_samples())
+    rate = mono.frame_rate
+    search = min(int(BOUNDARY_SEARCH_SEC * rate), int(chunk_len_ms * rate / 2000))
+    cuts = plan_chunk_boundaries(pcm, int(chunk_len_ms * rate / 1000), search, rate)
+    bounds_ms = [0] + [int(c * 1000 / rate) for c in cuts] + [len(audio)]
+    del pcm, mono
+
     chunks = []
-    for i in range(0, len(audio), chunk_len_ms):
-        chunk = audio[i:i+chunk_len_ms]
-        chunk_path = os.path.join(output_dir, f"chunk_{i//chunk_len_ms}.wav")
+    for i in range(len(bounds_ms) - 1):
+        chunk = audio[max(0, bounds_ms[i] - overlap_ms):bounds_ms[i + 1]]
+        chunk_path = os.path.join(output_dir, f"chunk_{i}.wav")
         chunk.export(chunk_path, format="wav")
         chunks.append(chunk_path)
     
@@ -233,31 +1230,361 @@ def split_audio(audio_path: str, chunk_len_ms: int, output_dir: str) -> list:
     return chunks
 
 
-def transcribe_chunk_worker(chunk_path: str):
-    """ Transcribe a single chunk using the Whisper model """
-    segments, info = model_worker.transcribe(chunk_path, language=LANGUAGE)
+def transcribe_chunk_worker(chunk, slot=None):
+    """ Transcribe a single chunk (WAV path or float32 PCM array) using the Whisper model """
+    segments, info = model_worker.transcribe(chunk, language=LANGUAGE)
     
     full_text = []
     try:
         for segment in segments:
             full_text.append(segment.text)
-            # Send progress (duration of segment) to main process
-            if progress_queue:
-                duration = segment.end - segment.start
-                progress_queue.put(duration)
+            # Add the segment duration to the job's shared counter (no IPC round-trip)
+            if slot is not None and progress_array is not None:
+                index, generation = slot
+                with progress_array.get_lock():
+                    # The slot may already belong to another job (this chunk outlived a cancel)
+                    if progress_generations is None or progress_generations[index] == generation:
+                        progress_array[index] += segment.end - segment.start
     except Exception as e:
         pass
         
     return " ".join(full_text), info.language
 
 
-def transcribe_chunks_local_parallel(chunks: list, num_workers: int):
-    """ Transcribe chunks using multiple CPU cores """
-    log(f"🚀 Starting parallel transcription on {num_workers} CPU cores...")
+def timed_chunk_worker(chunk, slot=None):
+    """ transcribe_chunk_worker plus the decode time and pid of the worker, for the job timing records """
+    start = time.perf_counter()
+    result = transcribe_chunk_worker(chunk, slot)
+    return result, time.perf_counter() - start, os.getpid()
+
+
+class ProgressCounter:
+    """
+    Seconds of audio transcribed for one job, stored in a slot of a shared memory array
+    so worker processes can add to it directly. Without an array the counter is local to this process.
+    """
+    def __init__(self, array=None, slot: int = None, generation: int = 0):
+        # What workers need to report to this counter: (slot, generation of its owner)
+        self.slot = (slot, generation) if array is not None else None
+        self._array = array if array is not None else multiprocessing.Array('d', 1)
+        self._index = slot if array is not None else 0
+        self.futures = []
+        if array is None:
+            self._array[0] = 0.0
+
+    def track(self, future):
+        """ Chunk reporting to this counter; the slot is only reused once all of them have finished """
+        self.futures.append(future)
+        return future
+
+    def add(self, seconds: float):
+        with self._array.get_lock():
+            self._array[self._index] += seconds
+
+    @property
+    def value(self) -> float:
+        return self._array[self._index]
+
+
+def monitor_progress(counter: ProgressCounter, total_sec, all_done_event):
+    """ Sample the progress counter, update tqdm (progressbar) and report structured progress """
+    pbar = tqdm(total=total_sec, file=ProgressLogger(), desc="Transcribing", unit="s", 
+               bar_format="{l_bar}{bar}| {n:.1f}/{total_fmt} [{elapsed}<{remaining}]",
+               ascii=" █")
+    start = time.time()
+    while not all_done_event.wait(PROGRESS_SAMPLE_SEC):
+        done = min(counter.value, total_sec) if total_sec else counter.value
+        if done > pbar.n:
+            pbar.update(done - pbar.n)
+            report_progress("transcription", done, total_sec, time.time() - start)
+
+    # Finished: fill the bar (segments do not always cover silence)
+    remaining = total_sec - pbar.n
+    if remaining > 0:
+        pbar.update(remaining)
+    report_progress("transcription", max(total_sec, pbar.n), total_sec, time.time() - start)
+    pbar.close()
+
+
+# ---------------- WORKER POOL ----------------
+def ping_worker():
+    """ Health check run inside a worker (the model is loaded by init_worker) """
+    time.sleep(0.1)
+    return os.getpid() if model_worker is not None else None
+
+
+class TranscriptionPool:
+    """
+    Long-lived pool of Whisper worker processes.
+    Each process loads the model once and serves every job submitted to the pool.
+    Crashed workers are detected (BrokenProcessPool) and the pool is restarted transparently.
+    """
+    def __init__(self, processes: int, cpu_threads: int = None, preload: bool = False):
+        self.processes = max(1, processes)
+        self.cpu_threads = cpu_threads or max(1, physical_core_count() // self.processes)
+        self.restarts = 0
+        self.active_jobs = 0
+        self.healthy = None
+        self._lock = threading.RLock()
+        # One progress slot per running job, shared with every worker process
+        self._progress = multiprocessing.Array('d', PROGRESS_SLOTS)
+        self._generations = multiprocessing.Array('l', PROGRESS_SLOTS)
+        # Oldest freed slot first, so a slot is reused as late as possible
+        self._free_slots = collections.deque(range(PROGRESS_SLOTS))
+        self._executor = self._new_executor()
+        if preload:
+            self.warm_up()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.processes, initializer=init_worker,
+                                   initargs=(self._progress, self.cpu_threads, self._generations))
+
+    def restart(self):
+        """ Replace the executor with a fresh one, cancelling anything queued on the old one """
+        with self._lock:
+            old = self._executor
+            self._executor = self._new_executor()
+            self.restarts += 1
+        old.shutdown(wait=False, cancel_futures=True)
+
+    def resize(self, processes: int, cpu_threads: int):
+        """ Change the worker layout; chunks already submitted finish on the old workers """
+        processes = max(1, processes)
+        with self._lock:
+            if (processes, cpu_threads) == (self.processes, self.cpu_threads):
+                return
+            old = self._executor
+            self.processes = processes
+            self.cpu_threads = cpu_threads
+            self._executor = self._new_executor()
+        old.shutdown(wait=False)
+
+    def resize_if_idle(self, processes: int, cpu_threads: int) -> bool:
+        """ Resize unless another job holds a lease; True if the pool now has the requested layout """
+        with self._lock:
+            if self.active_jobs > 0 and (max(1, processes), cpu_threads) != (self.processes, self.cpu_threads):
+                return False
+            self.resize(processes, cpu_threads)
+            return True
+
+    def submit(self, fn, *args):
+        with self._lock:
+            try:
+                return self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                log("⚠️ A transcription worker crashed. Restarting the worker pool...")
+                self.restart()
+                return self._executor.submit(fn, *args)
+
+    @property
+    def started_workers(self) -> int:
+        """ Worker processes the current executor has spawned (it spawns them on the first submit) """
+        return len(getattr(self._executor, "_processes", None) or {})
+
+    @contextlib.contextmanager
+    def progress_counter(self):
+        """ A shared memory progress counter for one job, released when the job ends """
+        with self._lock:
+            slot = self._free_slots.popleft() if self._free_slots else None
+        if slot is None:
+            # More concurrent jobs than slots: progress only advances as chunks complete
+            yield ProgressCounter()
+            return
+
+        # New owner: bump the generation and reset the value together, under the lock the workers use
+        with self._progress.get_lock():
+            self._generations[slot] += 1
+            self._progress[slot] = 0.0
+            generation = self._generations[slot]
+        counter = ProgressCounter(self._progress, slot, generation)
+        try:
+            yield counter
+        finally:
+            self._release_slot(slot, [f for f in counter.futures if not f.done()])
+
+    def _release_slot(self, slot: int, pending: list):
+        """ Return the slot once the chunks still running for its job (e.g. after a cancel) are done """
+        if not pending:
+            with self._lock:
+                self._free_slots.append(slot)
+            return
+        remaining = [len(pending)]
+        remaining_lock = threading.Lock()
+
+        def chunk_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                with self._lock:
+                    self._free_slots.append(slot)
+
+        for future in pending:
+            future.add_done_callback(chunk_done)
+
+    def health_check(self, timeout: float = POOL_HEALTH_TIMEOUT, workers: int = None) -> bool:
+        """ Ping the workers already started (or `workers` of them, loading the model in any cold one) """
+        count = self.started_workers if workers is None else workers
+        if count == 0:
+            return self.healthy
+        try:
+            futures = [self.submit(ping_worker) for _ in range(count)]
+            self.healthy = all(f.result(timeout=timeout) for f in futures)
+        except Exception:
+            self.healthy = False
+        return self.healthy
+
+    def warm_up(self):
+        log(f"🔥 Loading Whisper '{MODEL_SIZE}' in {self.processes} worker processes ({self.cpu_threads} threads each)...")
+        start = time.time()
+        if self.health_check(workers=self.processes):
+            log(f"✔️ Workers ready in {time.time() - start:.1f}s.")
+        else:
+            log("⚠️ Worker warm-up failed.")
+
+    def ensure_healthy(self):
+        """ Restart the pool if it is idle and its started workers do not answer the health check """
+        if self.active_jobs > 0 or self.started_workers == 0:
+            return # Busy, or no worker spawned yet (e.g. only the batched engine ran): nothing to check
+        if not self.health_check():
+            log("⚠️ Worker pool unhealthy. Restarting...")
+            self.restart()
+            # The new workers start cold and load the model with the next job
+            self.healthy = None
+
+    @contextlib.contextmanager
+    def lease(self):
+        """ Mark the pool as in use by a job (health checks are skipped while busy) """
+        with self._lock:
+            self.active_jobs += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.active_jobs -= 1
+
+    def status(self) -> dict:
+        return {
+            "processes": self.processes,
+            "cpu_threads": self.cpu_threads,
+            "active_jobs": self.active_jobs,
+            "restarts": self.restarts,
+            "started_workers": self.started_workers,
+            "healthy": self.healthy,
+            "model": MODEL_SIZE
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_shared_pool(threads: int = N_THREADS, preload: bool = False) -> TranscriptionPool:
+    """ Return the process-wide warm pool, creating it on first use """
+    global shared_pool
+    with _shared_pool_lock:
+        if shared_pool is None:
+            shared_pool = TranscriptionPool(*resolve_topology(threads))
+    if preload:
+        shared_pool.warm_up()
+    return shared_pool
+
+
+def dispatch_chunks(pool: TranscriptionPool, chunks, progress: ProgressCounter, max_in_flight: int,
+                    manifest: JobManifest = None) -> list:
+    """
+    Dynamic scheduler: a new chunk is handed out as soon as a worker frees up,
+    keeping at most max_in_flight of them queued (results arrive in any order).
+    Chunks lost to a crashed worker are resubmitted up to MAX_CHUNK_RETRIES times.
+    With a manifest, finished chunks are checkpointed and the ones it already holds are skipped.
+    Returns the (text, language) results reassembled in chunk order.
+    """
+    results = {}
+    inflight = {}
+    completed = manifest.completed_chunks() if manifest else {}
+
+    def drain():
+        done, _ = wait(list(inflight), timeout=1.0, return_when=FIRST_COMPLETED)
+        check_cancelled()
+        for future in done:
+            index, chunk, attempts, submitted = inflight.pop(future)
+            try:
+                results[index], seconds, worker = future.result()
+                # Worker time, plus the time the chunk waited for a free worker
+                record_span("whisper_chunk", seconds, index=index, worker=worker,
+                            queued_sec=round(max(0.0, time.time() - submitted - seconds), 3))
+                if manifest:
+                    manifest.record_chunk(index, *results[index])
+            except BrokenProcessPool:
+                if attempts >= MAX_CHUNK_RETRIES:
+                    raise
+                log(f"⚠️ Chunk {index} lost to a crashed worker. Retrying...")
+                inflight[progress.track(pool.submit(timed_chunk_worker, chunk, progress.slot))] = (index, chunk, attempts + 1, time.time())
+
+    count = 0
+    try:
+        for chunk in chunks:
+            if count in completed:
+                results[count] = completed[count]
+                if isinstance(chunk, np.ndarray):
+                    progress.add(len(chunk) / SAMPLE_RATE)
+                count += 1
+                continue
+            while len(inflight) >= max_in_flight:
+                drain()
+            check_cancelled()
+            inflight[progress.track(pool.submit(timed_chunk_worker, chunk, progress.slot))] = (count, chunk, 0, time.time())
+            count += 1
+
+        while inflight:
+            drain()
+    except JobCancelled:
+        # Queued chunks are dropped, the running ones finish on the (shared) workers
+        for future in inflight:
+            future.cancel()
+        raise
+
+    return [results[i] for i in range(count)]
+
+
+def _run_with_progress(pool: TranscriptionPool, chunks, total_sec: float, num_workers: int, max_in_flight: int,
+                       manifest: JobManifest = None) -> list:
+    """ Run dispatch_chunks on the given (or a temporary) pool with a tqdm monitor attached """
+    owns_pool = pool is None
+    if owns_pool:
+        pool = TranscriptionPool(num_workers)
+
+    try:
+        with pool.lease(), pool.progress_counter() as progress:
+            all_done_event = threading.Event()
+            monitor_thread = start_thread(monitor_progress, progress, total_sec, all_done_event)
+            try:
+                return dispatch_chunks(pool, chunks, progress, max_in_flight, manifest)
+            finally:
+                all_done_event.set()
+                monitor_thread.join()
+    finally:
+        if owns_pool:
+            pool.close()
+
 
-    texts = []
-    langs = []
+def _combine_results(results: list, overlap_sec: float = CHUNK_OVERLAP_SEC):
+    if not results:
+        return "", None
 
+    texts = [text for text, _ in results]
+    langs = [lang for _, lang in results]
+
+    from collections import Counter
+    final_lang = Counter(langs).most_common(1)[0][0]
+
+    return merge_chunk_texts(texts, overlap_sec).strip(), final_lang
+
+
+def wav_chunks_duration(chunks: list) -> float:
+    """ Total duration in seconds of the WAV chunk files """
     import wave
     total_estimated_seconds = 0.0
     for c in chunks:
@@ -269,69 +1596,491 @@ def transcribe_chunks_local_parallel(chunks: list, num_workers: int):
         except:
             # Fallback a stima se non è un wav standard o errore
             total_estimated_seconds += (CHUNK_LENGTH_MS_LOCAL / 1000)
-    
+    return total_estimated_seconds
+
+
+def transcribe_chunks_local_parallel(chunks: list, num_workers: int, pool: TranscriptionPool = None,
+                                     manifest: JobManifest = None, overlap_sec: float = CHUNK_OVERLAP_SEC):
+    """ Transcribe chunks using multiple CPU cores """
+    log(f"🚀 Starting parallel transcription on {num_workers} CPU cores...")
+
+    total_estimated_seconds = wav_chunks_duration(chunks)
     log(f"Duration calculated: {total_estimated_seconds:.2f}s")
-    
-    manager = multiprocessing.Manager()
-    queue = manager.Queue()
-    
-    # Function to monitor progress and update tqdm (progressbar)
-    def monitor_progress(q, total_sec):
-        pbar = tqdm(total=total_sec, file=ProgressLogger(), desc="Transcribing", unit="s", 
-                   bar_format="{l_bar}{bar}| {n:.1f}/{total_fmt} [{elapsed}<{remaining}]",
-                   ascii=" █")
-        processed_sec = 0
-        while True:
-            try:
-                duration = q.get(timeout=0.5)
-                if duration == "DONE":
-                    remaining = total_sec - pbar.n
-                    if remaining > 0:
-                        pbar.update(remaining)
-                    break
-                pbar.update(duration)
-                processed_sec += duration
-            except Exception: # Empty
-                if all_done_event.is_set():
-                    # Same cleanup if event triggers finish
-                    remaining = total_sec - pbar.n
-                    if remaining > 0:
-                        pbar.update(remaining)
-                    break
-        pbar.close()
 
+    num_workers = max(1, num_workers)
+    results = _run_with_progress(pool, chunks, total_estimated_seconds, num_workers, num_workers, manifest)
+    return _combine_results(results, overlap_sec)
+
+
+def transcribe_stream_local_parallel(audio_path: str, num_workers: int, chunk_sec: float = CHUNK_LENGTH_MS_LOCAL / 1000,
+                                    overlap_sec: float = CHUNK_OVERLAP_SEC, pool: TranscriptionPool = None,
+                                    manifest: JobManifest = None):
+    """
+    Transcribe the audio by streaming decoded PCM chunks straight to the workers.
+    At most STREAM_IN_FLIGHT_PER_WORKER chunks per worker are queued at any time,
+    so peak memory stays bounded regardless of the recording length.
+    """
+    total_estimated_seconds = probe_duration(audio_path)
+    if total_estimated_seconds > 0:
+        expected_windows = max(1, int(np.ceil(total_estimated_seconds / chunk_sec)))
+        num_workers = max(1, min(num_workers, expected_windows))
+    if pool is not None:
+        num_workers = min(num_workers, pool.processes)
+    log(f"🚀 Starting streaming transcription on {num_workers} CPU cores...")
+    log(f"Duration calculated: {total_estimated_seconds:.2f}s")
+
+    with contextlib.closing(decode_audio_stream(audio_path, STREAM_READ_SEC)) as windows:
+        chunks = plan_stream_chunks(windows, chunk_sec, overlap_sec)
+        results = _run_with_progress(pool, chunks, total_estimated_seconds, num_workers,
+                                     num_workers * STREAM_IN_FLIGHT_PER_WORKER, manifest)
+
+    return _combine_results(results, overlap_sec)
+
+
+# ---------------- BATCHED ENGINE ----------------
+batched_pipeline = None
+_batched_lock = threading.Lock()
+
+def get_batched_pipeline(cpu_threads: int) -> BatchedInferencePipeline:
+    """ Process-wide batched pipeline: the model is loaded once and reused by every job """
+    global batched_pipeline
+    if batched_pipeline is None or batched_pipeline[0] != cpu_threads:
+        log(f"🔥 Loading Whisper '{MODEL_SIZE}' for batched inference ({cpu_threads} threads)...")
+        model_instance = WhisperModel(MODEL_SIZE, device="cpu", compute_type=COMPUTE_TYPE, cpu_threads=cpu_threads)
+        batched_pipeline = (cpu_threads, BatchedInferencePipeline(model=model_instance))
+    return batched_pipeline[1]
+
+
+def transcribe_batched(chunks, total_sec: float, cpu_threads: int, batch_size: int = BATCH_SIZE,
+                       manifest: JobManifest = None, overlap_sec: float = CHUNK_OVERLAP_SEC):
+    """
+    Alternative engine: a single model instance splits each chunk into VAD segments
+    and decodes them in batches of batch_size, instead of one chunk per process.
+    Progress, checkpoints and the seam merge work exactly as with the worker pool.
+    """
+    log(f"🚀 Starting batched transcription ({cpu_threads} threads, batch size {batch_size})...")
+    log(f"Duration calculated: {total_sec:.2f}s")
+
+    progress = ProgressCounter()
     all_done_event = threading.Event()
-    monitor_thread = threading.Thread(target=monitor_progress, args=(queue, total_estimated_seconds))
-    monitor_thread.start()
+    monitor_thread = start_thread(monitor_progress, progress, total_sec, all_done_event)
 
+    results = []
+    completed = manifest.completed_chunks() if manifest else {}
     try:
-        with multiprocessing.Pool(processes=num_workers, initializer=init_worker, initargs=(queue,)) as pool:
-            results = pool.map(transcribe_chunk_worker, chunks)
-            
-            for text, lang in results:
-                texts.append(text)
-                langs.append(lang)
+        # One job at a time on the shared model, concurrent calls would only oversubscribe the cores
+        with _batched_lock:
+            pipeline = get_batched_pipeline(cpu_threads)
+            for index, chunk in enumerate(chunks):
+                check_cancelled()
+                if index in completed:
+                    results.append(completed[index])
+                    if isinstance(chunk, np.ndarray):
+                        progress.add(len(chunk) / SAMPLE_RATE)
+                    continue
+
+                with span("whisper_chunk", index=index, engine="batched"):
+                    segments, info = pipeline.transcribe(chunk, language=LANGUAGE, batch_size=batch_size)
+                    text = []
+                    for segment in segments:
+                        text.append(segment.text)
+                        progress.add(segment.end - segment.start)
+
+                results.append((" ".join(text), info.language))
+                if manifest:
+                    manifest.record_chunk(index, *results[-1])
     finally:
         all_done_event.set()
-        queue.put("DONE") 
-        monitor_thread.join() 
+        monitor_thread.join()
+
+    return _combine_results(results, overlap_sec)
+
+
+def transcribe_audio(args, pool: TranscriptionPool, output_dir: str, temp_files: list, manifest: JobManifest) -> tuple:
+    """ Plan the work units and transcribe with the selected ingest mode """
+    # Work unit size: many small units keep every worker busy until the end
+    if manifest.data["chunk_sec"]:
+        # Resumed job: the same plan is needed for the checkpointed chunks to line up
+        chunk_sec = manifest.data["chunk_sec"]
+        args.ingest, args.overlap = manifest.data["ingest"], manifest.data["overlap"]
+        log(f"⏯️ Resuming: {len(manifest.data['chunks'])} chunks already transcribed.")
+    elif args.chunk_minutes:
+        chunk_sec = args.chunk_minutes * 60
+    elif args.engine == "batched":
+        # Parallelism comes from batching inside each chunk, long chunks are fine
+        chunk_sec = MAX_UNIT_SEC
+    else:
+        chunk_sec = plan_unit_seconds(probe_duration(args.file_audio), pool.processes)
+    log(f"📐 Work unit size: ~{chunk_sec:.0f}s per chunk")
+    manifest.data["chunk_sec"] = chunk_sec
+    manifest.save()
 
-    from collections import Counter
-    final_lang = Counter(langs).most_common(1)[0][0]
+    # The batched engine runs one model with all the threads of the pool topology
+    batched_threads = pool.processes * pool.cpu_threads
+
+    transcript = ""
+    if args.ingest == "stream":
+        # Streaming decode + transcription (no intermediate files)
+        try:
+            if args.engine == "batched":
+                with contextlib.closing(decode_audio_stream(args.file_audio, STREAM_READ_SEC)) as windows:
+                    chunks = plan_stream_chunks(windows, chunk_sec, args.overlap)
+                    transcript, audio_lang = transcribe_batched(
+                        chunks, probe_duration(args.file_audio), batched_threads, args.batch_size, manifest, args.overlap)
+            else:
+                transcript, audio_lang = transcribe_stream_local_parallel(
+                    args.file_audio, pool.processes, chunk_sec, args.overlap, pool, manifest)
+        except (OSError, subprocess.SubprocessError) as e:
+            log(f"⚠️ Streaming ingest unavailable ({e}). Falling back to WAV chunks...")
+            args.ingest = "files"
+            manifest.data["ingest"] = "files"
+            manifest.data["chunks"] = {}
+
+    if args.ingest == "files":
+        # Splitting Audio in chunk
+        with span("split_audio"):
+            chunks = split_audio(args.file_audio, int(chunk_sec * 1000), output_dir, int(args.overlap * 1000))
+        temp_files.extend(chunks)
 
-    return " ".join(texts).strip(), final_lang
+        # Transcription (Parallel if multiple chunks)
+        if args.engine == "batched":
+            transcript, audio_lang = transcribe_batched(
+                chunks, wav_chunks_duration(chunks), batched_threads, args.batch_size, manifest, args.overlap)
+        else:
+            num_workers = min(pool.processes, len(chunks)) if chunks else 0
+            transcript, audio_lang = transcribe_chunks_local_parallel(chunks, num_workers, pool, manifest, args.overlap)
+
+    return transcript, audio_lang
+
+
+# ---------------- GEMINI CLIENT ----------------
+class TokenBucket:
+    """ Async token bucket: rate tokens per second, up to capacity stored for bursts """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """ Wait for a token, returns the seconds spent waiting """
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class GeminiClient:
+    """
+    One genai client shared by every job of the process.
+    Calls are async and run on a background event loop; they go through a shared rate limit,
+    are retried with exponential backoff and jitter, and their latency and retries are counted.
+    """
+
+    def __init__(self, api_key: str, base_url: str = None, rpm: float = GEMINI_RPM, burst: int = GEMINI_BURST,
+                 max_retries: int = GEMINI_MAX_RETRIES):
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        self.api_key = api_key
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
+        self.rpm = rpm
+        self.burst = burst
+        self.max_retries = max_retries
+        self.stats = {}
+        self.loop = None
+        self.bucket = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="gemini", daemon=True).start()
+                self.bucket = TokenBucket(self.rpm / 60, self.burst)
+            return self.loop
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, genai_errors.APIError):
+            return e.code in GEMINI_RETRY_CODES
+        return isinstance(e, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+    @staticmethod
+    def _retry_after(e: Exception):
+        response = getattr(e, "response", None)
+        try:
+            return float(response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _record(self, name: str, latency: float, ok: bool, retry: bool = False, throttled: float = 0.0):
+        st = self.stats.setdefault(name, {"calls": 0, "errors": 0, "retries": 0, "latency_sec": 0.0,
+                                          "max_latency_sec": 0.0, "throttled_sec": 0.0})
+        st["calls"] += 1
+        st["errors"] += 0 if ok else 1
+        st["retries"] += 1 if retry else 0
+        st["latency_sec"] += latency
+        st["max_latency_sec"] = max(st["max_latency_sec"], latency)
+        st["throttled_sec"] += throttled
+        metrics.observe("audiotto_gemini_request_seconds", latency, call=name,
+                        outcome="ok" if ok else ("retry" if retry else "error"))
+        if throttled:
+            metrics.inc("audiotto_gemini_throttled_seconds_total", throttled, call=name)
+
+    def metrics(self) -> dict:
+        """ Per-call counters: calls, errors, retries, average/max latency and time spent rate limited """
+        out = {}
+        for name, st in self.stats.items():
+            out[name] = {**st, "avg_latency_sec": round(st["latency_sec"] / st["calls"], 3) if st["calls"] else 0.0}
+        return out
+
+    async def call(self, name: str, request):
+        """ Await request() (a coroutine factory) with rate limiting and retries """
+        attempt = 0
+        while True:
+            throttled = await self.bucket.acquire()
+            start = time.time()
+            try:
+                result = await asyncio.wait_for(request(), GEMINI_TIMEOUT_SEC)
+                self._record(name, time.time() - start, ok=True, throttled=throttled)
+                return result
+            except Exception as e:
+                retry = self._retryable(e) and attempt < self.max_retries
+                self._record(name, time.time() - start, ok=False, retry=retry, throttled=throttled)
+                if not retry:
+                    raise
+                # Full jitter: a random wait up to the exponential backoff, or what the server asks for
+                delay = self._retry_after(e) or random.uniform(0, min(GEMINI_BACKOFF_MAX_SEC, GEMINI_BACKOFF_SEC * 2 ** attempt))
+                attempt += 1
+                reason = f"{e.code} {e.status}" if isinstance(e, genai_errors.APIError) else type(e).__name__
+                log(f"⏳ Gemini {name} failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def generate(self, contents, config=None, model_name: str = None):
+        return await self.call("generate", lambda: self.client.aio.models.generate_content(
+            model=model_name or model, contents=contents, config=config))
+
+    async def stream(self, contents, on_text, config=None, on_restart=None, model_name: str = None):
+        """
+        Streamed generation: on_text(text) is called for every received piece.
+        A retried attempt starts from scratch, so on_restart() is called before each attempt.
+        """
+        async def request():
+            if on_restart:
+                on_restart()
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                    model=model_name or model, contents=contents, config=config):
+                if chunk.text:
+                    on_text(chunk.text)
+
+        return await self.call("stream", request)
+
+    async def upload(self, path: str, mime_type: str):
+        return await self.call("upload", lambda: self.client.aio.files.upload(file=path, config={'mime_type': mime_type}))
+
+    def run(self, coro):
+        """ Run a coroutine of this client from a job thread, keeping the job logger and cancellation """
+        logger, cancel_event = current_logger(), _job_cancel.get()
+
+        async def bound():
+            with job_context(logger, cancel_event):
+                return await coro
+
+        future = asyncio.run_coroutine_threadsafe(bound(), self._get_loop())
+        while True:
+            try:
+                return future.result(timeout=1.0)
+            except FutureTimeout:
+                if cancel_event is not None and cancel_event.is_set():
+                    future.cancel()
+                    raise JobCancelled()
+
+
+gemini_client = None
+_gemini_lock = threading.Lock()
+
+def gemini_api_key():
+    """ Read at call time: the GUI can save a key after this module was imported """
+    return os.getenv("GEMINI_API_KEY") or GEMINI_API_KEY
+
+
+def get_gemini() -> GeminiClient:
+    """ The process-wide Gemini client (rebuilt if the API key changes) """
+    global gemini_client
+    api_key = gemini_api_key()
+    with _gemini_lock:
+        if gemini_client is None or gemini_client.api_key != api_key:
+            gemini_client = GeminiClient(api_key, GEMINI_BASE_URL)
+        return gemini_client
+
+
+def generation_config() -> types.GenerateContentConfig:
+    """ Safety settings used for every request: lecture notes may touch medical or sensitive topics """
+    return types.GenerateContentConfig(
+        safety_settings=[
+            types.SafetySetting(
+                category="HARM_CATEGORY_HATE_SPEECH",
+                threshold="BLOCK_NONE"
+            ),
+            types.SafetySetting(
+                category="HARM_CATEGORY_DANGEROUS_CONTENT",
+                threshold="BLOCK_NONE"
+            ),
+            types.SafetySetting(
+                category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                threshold="BLOCK_NONE"
+            ),
+            types.SafetySetting(
+                category="HARM_CATEGORY_HARASSMENT",
+                threshold="BLOCK_NONE"
+            ),
+        ]
+    )
+
+
+class LatexStreamWriter:
+    """
+    Writes a streamed LaTeX document to disk as it arrives.
+    Text before \\documentclass is dropped on the fly and progress is logged at most every STREAM_PROGRESS_SEC.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.restart()
+
+    def restart(self):
+        self.pending = ""
+        self.text = []
+        self.received = 0
+        self.sections = 0
+        self.started = False
+        self.warned = False
+        self.last_report = time.time()
+        self._tail = ""
+        open(self.path, "w", encoding="utf-8").close()
+
+    def feed(self, text: str):
+        self.received += len(text)
+        if not self.started:
+            self.pending += text
+            start = self.pending.find("\\documentclass")
+            if start == -1:
+                if len(self.pending) > STREAM_VALIDATE_CHARS and not self.warned:
+                    log("⚠️ The streamed response does not start with \\documentclass yet.")
+                    self.warned = True
+                return
+            self.started = True
+            text, self.pending = self.pending[start:], ""
+        self._write(text)
+
+    def _write(self, text: str):
+        self.text.append(text)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+        # Count sections across piece boundaries
+        window = self._tail + text
+        self.sections += window.count("\\section{") - self._tail.count("\\section{")
+        self._tail = window[-16:]
+
+        now = time.time()
+        if now - self.last_report >= STREAM_PROGRESS_SEC:
+            self.last_report = now
+            log(f"   ✍️ Receiving LaTeX: {self.received / 1024:.1f} KB, {self.sections} sections")
+
+    def finish(self) -> str:
+        """ Final document, trimmed after the last \\end{document} and rewritten once """
+        latex = "".join(self.text) if self.started else self.pending
+        latex = latex.strip()
+        if "\\end{document}" in latex:
+            latex = latex[:latex.rfind("\\end{document}") + len("\\end{document}")]
+        else:
+            log("⚠️ The streamed response has no \\end{document} (output may be truncated).")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(latex)
+        log(f"   ✍️ LaTeX received: {self.received / 1024:.1f} KB, {self.sections} sections")
+        return latex
 
 
 # ---------------- DOCUMENT GENERATION ----------------
-def generate_latex_document(text: str, title: str, slides_path: str, audio_lang: str) -> str:
-    if not GEMINI_API_KEY:
+def upload_slides(slides_path: str):
+    """
+    Upload the PDF slides to Gemini, returns the file handle (None without slides).
+    Handles are remembered by content hash until shortly before Gemini expires them.
+    """
+    if not slides_path:
+        return None
+    if not gemini_api_key():
+        return None
+
+    gemini = get_gemini()
+    cache_key = hash_key("gemini-file", hash_file_cached(slides_path), hash_key(gemini.api_key))
+    cached = get_gemini_file_cache().get(cache_key)
+    if cached and cached["expires"] > time.time():
+        log(f"   - PDF already uploaded to Gemini (URI: {cached['uri']}, expires in {(cached['expires'] - time.time()) / 3600:.0f}h)")
+        return types.File(name=cached["name"], uri=cached["uri"], mime_type=cached["mime_type"])
+
+    log(f"   - Uploading PDF to Gemini: {os.path.basename(slides_path)}")
+    uploaded_file = gemini.run(gemini.upload(slides_path, 'application/pdf'))
+    log(f"   - PDF Uploaded (URI: {uploaded_file.uri})")
+
+    if uploaded_file.expiration_time:
+        get_gemini_file_cache().put(cache_key, {
+            "name": uploaded_file.name,
+            "uri": uploaded_file.uri,
+            "mime_type": uploaded_file.mime_type or 'application/pdf',
+            "expires": uploaded_file.expiration_time.timestamp() - GEMINI_FILE_TTL_MARGIN_SEC
+        })
+    return uploaded_file
+
+
+def prepare_slides(slides_path: str, mode: str = SLIDES_MODE):
+    """
+    What the generation attaches for the slides: the uploaded PDF ('pdf'), a local SlideDigest ('digest'),
+    or the digest only when it is much smaller than the PDF ('auto').
+    """
+    if not slides_path:
+        return None
+    if mode in ("digest", "auto"):
+        digest = build_slide_digest(slides_path)
+        if mode == "digest" or digest.payload_bytes <= digest.pdf_bytes * DIGEST_AUTO_RATIO:
+            return digest
+        log("   - Digest is not much smaller than the PDF, uploading the PDF.")
+    return upload_slides(slides_path)
+
+
+def slide_parts(attachment, note: str = "") -> list:
+    """ Prompt parts for the slides: the uploaded PDF or a SlideDigest """
+    if isinstance(attachment, SlideDigest):
+        return [f"The following text and slide renders were extracted from the PDF slides. Refer to them for context, diagrams, and structure.{note}",
+                *attachment.parts()]
+    return [f"Refer to the attached PDF slides for context, diagrams, and structure.{note}", attachment]
+
+
+def generate_latex_document(text: str, title: str, slides_path: str, audio_lang: str, uploaded_file=None,
+                            use_cache: bool = True, stream_path: str = None) -> str:
+    """
+    uploaded_file: slides prepared with prepare_slides (uploaded PDF or SlideDigest), otherwise the PDF is uploaded here.
+    use_cache=False skips the LLM cache lookup (the new draft still refreshes it).
+    stream_path: stream the response into this .tex file while it is generated.
+    """
+    if not gemini_api_key():
         log("❌ Gemini API Key not found.")
         return ""
 
     log("🧠 Generating LaTeX document with Gemini (v3)...")
     
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        gemini = get_gemini()
         
         prompt_parts = []
         
@@ -357,44 +2106,33 @@ TRANSCRIPTION:
 """
         prompt_parts.append(base_prompt)
 
+        cache_key = llm_cache_key("draft-digest" if isinstance(uploaded_file, SlideDigest) else "draft", base_prompt, slides_path)
+        cached = get_llm_cache().get(cache_key) if use_cache else None
+        if cached:
+            log("♻️ LaTeX draft found in cache, skipping Gemini.")
+            return cached["latex"]
+
         # 2. Add PDF file if available
         if slides_path:
-            log(f"   - Uploading PDF to Gemini: {os.path.basename(slides_path)}")
-            # Upload file to Gemini
-            with open(slides_path, "rb") as f:
-                uploaded_file = client.files.upload(file=f, config={'mime_type': 'application/pdf'})
-            
-            log(f"   - PDF Uploaded (URI: {uploaded_file.uri})")
-            prompt_parts.append("Refer to the attached PDF slides for context, diagrams, and structure.")
-            prompt_parts.append(uploaded_file)
+            # Upload file to Gemini (unless the pipeline already did it during transcription)
+            if uploaded_file is None:
+                uploaded_file = upload_slides(slides_path)
+            prompt_parts += slide_parts(uploaded_file)
         else:
             log("   - Sending transcription only.")
 
         # 3. Generate Content
-        response = client.models.generate_content(
-            model=model,
-            contents=prompt_parts,
-            config=types.GenerateContentConfig(
-                safety_settings=[
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HATE_SPEECH",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HARASSMENT",
-                        threshold="BLOCK_NONE"
-                    ),
-                ]
-            )
-        )
+        if stream_path:
+            writer = LatexStreamWriter(stream_path)
+            gemini.run(gemini.stream(prompt_parts, writer.feed, generation_config(), on_restart=writer.restart))
+            latex = writer.finish()
+            if not latex:
+                log("⚠️ Gemini response was empty.")
+                return ""
+            get_llm_cache().put(cache_key, {"model": model, "latex": latex})
+            return latex
+
+        response = gemini.run(gemini.generate(prompt_parts, generation_config()))
         
         # Check for safety blocks or empty response
         if not response.text:
@@ -410,23 +2148,27 @@ TRANSCRIPTION:
         if "\\end{document}" in latex:
             latex = latex[:latex.rfind("\\end{document}") + len("\\end{document}")]
 
+        get_llm_cache().put(cache_key, {"model": model, "latex": latex})
         return latex
 
 
 
+    except JobCancelled:
+        raise
+
     except Exception as e:
         log(f"❌ Error during Gemini request: {e}")
         return ""
 
 
-def review_latex_content(latex_code: str) -> str:
-    if not GEMINI_API_KEY:
+def review_latex_content(latex_code: str, use_cache: bool = True) -> str:
+    if not gemini_api_key():
         return latex_code
 
     log("🧠 Reviewing content and code with Gemini (Expert Mode)...")
     
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        gemini = get_gemini()
         
         prompt = f"""
 You are an expert academic professor and technical reviewer.
@@ -447,30 +2189,13 @@ LaTeX to Review:
 Output ONLY the corrected LaTeX document, starting with \\documentclass...
 """
 
-        response = client.models.generate_content(
-            model=model,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                safety_settings=[
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HATE_SPEECH",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HARASSMENT",
-                        threshold="BLOCK_NONE"
-                    ),
-                ]
-            )
-        )
+        cache_key = llm_cache_key("review", prompt)
+        cached = get_llm_cache().get(cache_key) if use_cache else None
+        if cached:
+            log("♻️ Review found in cache, skipping Gemini.")
+            return cached["latex"]
+
+        response = gemini.run(gemini.generate(prompt, generation_config()))
 
         if not response.text:
             log("⚠️ Review response empty. Using original draft.")
@@ -483,35 +2208,505 @@ Output ONLY the corrected LaTeX document, starting with \\documentclass...
             reviewed_latex = reviewed_latex[reviewed_latex.find("\\documentclass"):]
         if "\\end{document}" in reviewed_latex:
             reviewed_latex = reviewed_latex[:reviewed_latex.rfind("\\end{document}") + len("\\end{document}")]
-            
+
+        get_llm_cache().put(cache_key, {"model": model, "latex": reviewed_latex})
         return reviewed_latex
 
+    except JobCancelled:
+        raise
+
     except Exception as e:
         log(f"⚠️ Error during review: {e}. Using original draft.")
         return latex_code
 
 
+# ---------------- SECTIONED GENERATION ----------------
+def split_transcript(text: str, max_words: int = SECTION_WORDS) -> list:
+    """
+    Split the transcript into consecutive time sections of about max_words words,
+    cutting at the end of a sentence. The last section absorbs a short remainder.
+    """
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    sections, current, count = [], [], 0
+    for sentence in sentences:
+        words = len(sentence.split())
+        if current and count + words > max_words:
+            sections.append(" ".join(current))
+            current, count = [], 0
+        current.append(sentence)
+        count += words
+    if current:
+        if sections and count < max_words // 4:
+            sections[-1] += " " + " ".join(current)
+        else:
+            sections.append(" ".join(current))
+    return sections
+
+
+def split_latex_sections(latex: str, max_words: int = SECTION_WORDS) -> tuple:
+    """
+    Split a LaTeX document into (head, parts, tail): head is everything before the first \\section,
+    tail starts at \\end{document}; consecutive sections are grouped into parts of about max_words words.
+    """
+    end = latex.rfind("\\end{document}")
+    body, tail = (latex[:end], latex[end:]) if end != -1 else (latex, "")
+    starts = [m.start() for m in re.finditer(r"\\section\*?\{", body)]
+    if not starts:
+        return body, [], tail
+
+    head = body[:starts[0]]
+    sections = [body[a:b] for a, b in zip(starts, starts[1:] + [len(body)])]
+    parts, current = [], ""
+    for section in sections:
+        if current and len((current + section).split()) > max_words:
+            parts.append(current)
+            current = ""
+        current += section
+    parts.append(current)
+    return head, parts, tail
+
+
+def clean_latex_fragment(text: str) -> str:
+    """ Keep only body content: drop markdown fences, preamble and \\end{document} if the model added them """
+    text = re.sub(r"^```[a-zA-Z]*\s*|```\s*$", "", text.strip()).strip()
+    if "\\begin{document}" in text:
+        text = text[text.find("\\begin{document}") + len("\\begin{document}"):]
+    if "\\end{document}" in text:
+        text = text[:text.find("\\end{document}")]
+    return text.strip()
+
+
+def latex_preamble(title: str) -> str:
+    """ Preamble, title page and table of contents shared by every sectioned document """
+    safe_title = re.sub(r"([&%$#_{}])", r"\\\1", title.replace('_', ' '))
+    return f"""\\documentclass[12pt]{{article}}
+\\usepackage[utf8]{{inputenc}}
+\\usepackage[margin=2.5cm]{{geometry}}
+\\usepackage{{amsmath}}
+\\usepackage{{graphicx}}
+\\usepackage{{helvet}}
+\\renewcommand{{\\familydefault}}{{\\sfdefault}}
+
+\\title{{Lecture Notes: {safe_title}}}
+\\date{{}}
+
+\\begin{{document}}
+\\maketitle
+\\tableofcontents
+\\newpage
+
+"""
+
+
+async def _cached_fragment(gemini: GeminiClient, kind: str, prompt: str, contents, slides_path: str, use_cache: bool) -> str:
+    """ One section request: LLM cache first, then Gemini """
+    cache_key = llm_cache_key(kind, prompt, slides_path)
+    cached = get_llm_cache().get(cache_key) if use_cache else None
+    if cached:
+        return cached["latex"]
+
+    response = await gemini.generate(contents, generation_config())
+    if not response.text:
+        raise ValueError(f"empty response ({kind})")
+    fragment = clean_latex_fragment(response.text)
+    get_llm_cache().put(cache_key, {"model": model, "latex": fragment})
+    return fragment
+
+
+def section_slide_ranges(sections: list, pages: int, margin: int = SECTION_SLIDE_MARGIN) -> list:
+    """
+    Slide range (first, last, 1-based) each transcript section most likely covers: lectures go through
+    the deck in order, so a section gets the share of the slides matching its share of the words, plus a margin.
+    """
+    total = sum(len(section.split()) for section in sections) or 1
+    ranges, offset = [], 0
+    for section in sections:
+        words = len(section.split())
+        first = int(offset / total * pages) + 1 - margin
+        last = math.ceil((offset + words) / total * pages) + margin
+        ranges.append((max(1, first), min(pages, max(last, first))))
+        offset += words
+    return ranges
+
+
+def generate_latex_sectioned(text: str, title: str, slides_path: str, audio_lang: str, uploaded_file=None,
+                             use_cache: bool = True) -> str:
+    """
+    Map-reduce generation for long lectures: every time section of the transcript is turned into LaTeX
+    by its own request (all in parallel), then a light pass writes the final summary from the outline.
+    """
+    if not gemini_api_key():
+        log("❌ Gemini API Key not found.")
+        return ""
+
+    sections = split_transcript(text)
+    log(f"🧠 Generating LaTeX document with Gemini in {len(sections)} parallel sections...")
+
+    try:
+        gemini = get_gemini()
+        # Slides as the job prepared them (--slides-mode): a digest is sliced to each section's range,
+        # the uploaded PDF is shared by every section and each request is pointed at its own pages
+        if slides_path and uploaded_file is None:
+            uploaded_file = upload_slides(slides_path)
+        digest = uploaded_file if isinstance(uploaded_file, SlideDigest) else None
+        if digest is not None:
+            pages = digest.pages
+        elif uploaded_file is not None:
+            with fitz.open(slides_path) as doc:
+                pages = doc.page_count
+        else:
+            pages = 0
+        ranges = section_slide_ranges(sections, pages) if pages else None
+
+        async def generate_all():
+            done = [0]
+
+            async def generate_one(i, section):
+                prompt = f"""
+You are an expert assistant that writes clear, academic LaTeX lesson notes.
+This is part {i + 1} of {len(sections)} of the transcription of the lecture "{title.replace('_', ' ')}".
+
+IMPORTANT RULES:
+- Output ONLY LaTeX body content for this part: start with `\\section{{...}}` and use subsections where useful.
+- DO NOT include `\\documentclass`, packages, `\\begin{{document}}`, `\\end{{document}}`, a title, an abstract or a summary section.
+- DO NOT include explanations, comments, markdown code blocks, or introductory text.
+- You must write in the SAME LANGUAGE as the transcription. The detected language is: {audio_lang}.
+- Use only commands from the standard packages amsmath and graphicx.
+- Reformulate sentences to be clear, well-organized, and academic.
+- The part may start or end in the middle of a topic: continue naturally, without introductions or conclusions.
+
+TRANSCRIPTION (part {i + 1}/{len(sections)}):
+{section}
+"""
+                contents = [prompt]
+                kind = "section"
+                if ranges:
+                    first, last = ranges[i]
+                    if digest is not None:
+                        contents += slide_parts(digest.slice(first, last),
+                                                f" These are slides {first}-{last} of {pages}, the ones this part most likely covers.")
+                        kind = f"section-slides-{first}-{last}"
+                    else:
+                        contents += slide_parts(uploaded_file,
+                                                f" This part most likely covers slides {first}-{last} of {pages}: focus on those,"
+                                                f" use the others only for context.")
+                        kind = f"section-pdf-{first}-{last}"
+                fragment = await _cached_fragment(gemini, kind, prompt, contents, slides_path, use_cache)
+                done[0] += 1
+                log(f"   - Section {i + 1}/{len(sections)} ready ({done[0]}/{len(sections)} done)")
+                return fragment
+
+            return await asyncio.gather(*[generate_one(i, sec) for i, sec in enumerate(sections)])
+
+        fragments = gemini.run(generate_all())
+
+        # Reduce: the summary only needs the outline of the generated sections
+        outline = "\n".join(re.findall(r"\\(?:sub)?section\*?\{[^\n]*\}", "\n".join(fragments)))
+        summary_prompt = f"""
+You are an expert assistant that writes clear, academic LaTeX lesson notes.
+Write the final summary section of the lecture notes "{title.replace('_', ' ')}", whose outline is below.
+
+IMPORTANT RULES:
+- Output ONLY one `\\section{{...}}` (with a title meaning "Summary" in the document language) and its content.
+- DO NOT include explanations, comments, markdown code blocks, or any preamble.
+- Write in the language: {audio_lang}.
+
+OUTLINE:
+{outline}
+"""
+        try:
+            summary = gemini.run(_cached_fragment(gemini, "summary", summary_prompt, summary_prompt, None, use_cache))
+        except JobCancelled:
+            raise
+        except Exception as e:
+            log(f"⚠️ Summary section failed ({e}), continuing without it.")
+            summary = ""
+
+        return latex_preamble(title) + "\n\n".join(fragments + [summary]).strip() + "\n\n\\end{document}"
+
+    except JobCancelled:
+        raise
+
+    except Exception as e:
+        log(f"❌ Error during Gemini request: {e}")
+        return ""
+
+
+def review_latex_sectioned(latex_code: str, use_cache: bool = True) -> str:
+    """ Review every part of the document in parallel; a part whose review fails keeps its draft """
+    if not gemini_api_key():
+        return latex_code
+
+    head, parts, tail = split_latex_sections(latex_code)
+    if len(parts) < 2:
+        return review_latex_content(latex_code, use_cache)
+
+    log(f"🧠 Reviewing content and code with Gemini in {len(parts)} parallel parts...")
+    gemini = get_gemini()
+
+    async def review_all():
+        async def review_one(i, part):
+            prompt = f"""
+You are an expert academic professor and technical reviewer.
+Your goal is to refine the following fragment (part {i + 1} of {len(parts)}) of a LaTeX document.
+
+1. **Conceptual & Scientific Accuracy**: 
+   - Identify any scientific, medical, or mathematical errors and CORRECT ONLY THE ERRORS.
+
+2. **LaTeX Validity**: 
+   - Fix any broken environments, unclosed brackets, or invalid math syntax.
+
+LaTeX fragment to Review:
+{part}
+
+Output ONLY the corrected fragment, without preamble, `\\begin{{document}}` or `\\end{{document}}`.
+"""
+            return await _cached_fragment(gemini, "review-part", prompt, prompt, None, use_cache)
+
+        return await asyncio.gather(*[review_one(i, p) for i, p in enumerate(parts)], return_exceptions=True)
+
+    try:
+        reviewed = gemini.run(review_all())
+    except JobCancelled:
+        raise
+    except Exception as e:
+        log(f"⚠️ Error during review: {e}. Using original draft.")
+        return latex_code
+
+    merged = []
+    for i, (part, result) in enumerate(zip(parts, reviewed)):
+        if isinstance(result, BaseException) or not result:
+            log(f"⚠️ Review of part {i + 1} failed ({result}). Using its draft.")
+            merged.append(part.strip())
+        else:
+            merged.append(result)
+    return head + "\n\n".join(merged) + "\n\n" + (tail or "\\end{document}")
+
+
+def use_sectioned(mode: str, text: str, stage: str = "generation") -> bool:
+    """ 'auto' switches to sectioned generation/review for texts longer than 1.5 sections """
+    if mode == "auto":
+        words = len(text.split())
+        if words > SECTION_WORDS * 1.5:
+            log(f"📚 Long lecture ({words} words): 'auto' switches to sectioned {stage} "
+                f"(~{SECTION_WORDS} words per section, GENERATION=single to disable)")
+            return True
+        return False
+    return mode == "sectioned"
+
+
 
 
 
 # ---------------- COMPILATION ----------------
+LATEX_ERROR_RE = re.compile(r"^[^\n:]*\.tex:(\d+): (.+)$", re.M)
+LATEX_WARNING_RE = re.compile(r"^(?:LaTeX|Package \w+) Warning: (.+)$", re.M)
+LATEX_RERUN_RE = re.compile(r"Rerun to get|Label\(s\) may have changed")
+compile_slots = threading.BoundedSemaphore(LATEX_JOBS)
+
+def parse_latex_log(log_text: str) -> list:
+    """ Errors reported by pdflatex -file-line-error: [{"line": n, "message": text}] """
+    return [{"line": int(m.group(1)), "message": m.group(2).strip()} for m in LATEX_ERROR_RE.finditer(log_text)]
+
+
+def latex_aux_state(tex_path: str) -> str:
+    """ Hash of the auxiliary files a rerun would read (labels, table of contents, bookmarks) """
+    base = os.path.splitext(tex_path)[0]
+    digest = hashlib.sha256()
+    for ext in LATEX_AUX_EXTS:
+        try:
+            with open(base + ext, "r", encoding="utf-8", errors="replace") as f:
+                content = f.read()
+        except OSError:
+            continue
+        # Skip the lines written on every run regardless of the document
+        content = "\n".join(l for l in content.splitlines() if l.strip() not in ("\\relax", "") and "@abspage@last" not in l)
+        if content:
+            digest.update(f"{ext}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def run_pdflatex(tex_path: str, timeout: float = None) -> dict:
+    """
+    One pdflatex run in a compile slot (at most LATEX_JOBS at once in the process).
+    Returns {"ok", "errors", "warnings", "rerun", "timed_out", "seconds"}; errors are parsed from the .log file.
+    """
+    output_dir, file_name = os.path.split(tex_path)
+    timeout = timeout or LATEX_TIMEOUT_SEC
+    if not compile_slots.acquire(blocking=False):
+        log("   - Waiting for a free compile slot...")
+        compile_slots.acquire()
+
+    start = time.time()
+    timed_out = False
+    try:
+        proc = subprocess.run(
+            ["pdflatex", "-interaction=nonstopmode", "-file-line-error", file_name],
+            cwd=output_dir or ".", capture_output=True, timeout=timeout
+        )
+        returncode = proc.returncode
+    except subprocess.TimeoutExpired:
+        # subprocess.run kills the runaway pdflatex before raising
+        timed_out, returncode = True, -1
+    except OSError as e:
+        return {"ok": False, "errors": [{"line": 0, "message": str(e)}], "warnings": [], "rerun": False,
+                "timed_out": False, "seconds": 0.0}
+    finally:
+        compile_slots.release()
+
+    log_path = os.path.splitext(tex_path)[0] + ".log"
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            log_text = f.read()
+    except OSError:
+        log_text = ""
+
+    errors = parse_latex_log(log_text)
+    if timed_out:
+        errors.append({"line": 0, "message": f"pdflatex killed after {timeout:.0f}s"})
+    elif returncode != 0 and not errors:
+        errors = [{"line": 0, "message": f"pdflatex exited with code {returncode}"}]
+    record_span("pdflatex", time.time() - start, ok=returncode == 0, timed_out=timed_out)
+    return {
+        "ok": returncode == 0,
+        "errors": errors,
+        "warnings": LATEX_WARNING_RE.findall(log_text),
+        "rerun": bool(LATEX_RERUN_RE.search(log_text)),
+        "timed_out": timed_out,
+        "seconds": round(time.time() - start, 2)
+    }
+
+
+def compile_latex(tex_path: str, max_runs: int = LATEX_MAX_RUNS) -> dict:
+    """
+    Run pdflatex until the auxiliary files stop changing (at most max_runs times).
+    Returns the diagnostics of the last run plus "runs" and the total "seconds".
+    """
+    runs, total = 0, 0.0
+    while True:
+        before = latex_aux_state(tex_path)
+        result = run_pdflatex(tex_path)
+        runs += 1
+        total += result["seconds"]
+        if not result["ok"] or runs >= max_runs:
+            break
+        if latex_aux_state(tex_path) == before and not result["rerun"]:
+            break
+    return {**result, "runs": runs, "seconds": round(total, 2)}
+
+
 def compile_pdf(tex_path: str) -> bool:
     log("📄 Compiling PDF...")
 
-    output_dir, file_name = os.path.split(tex_path)
+    result = compile_latex(tex_path)
+    if not result["ok"]:
+        reason = "timed out" if result["timed_out"] else f"{len(result['errors'])} errors"
+        log(f"❌ PDF compilation failed ({reason}).")
+        for err in result["errors"][:5]:
+            log(f"   - line {err['line']}: {err['message']}")
+        return False
+
+    log(f"✅ PDF successfully generated ({result['runs']} pdflatex runs, {result['seconds']:.1f}s, {len(result['warnings'])} warnings).")
+    return True
+
+
+def error_fragments(lines: list, errors: list, context: int = REPAIR_CONTEXT_LINES) -> list:
+    """
+    Line ranges (start, end), 0-based and end-exclusive, around the error lines,
+    widened to the surrounding blank lines and merged when they overlap.
+    """
+    ranges = []
+    for err in errors:
+        line = min(max(err["line"] - 1, 0), len(lines) - 1)
+        start, end = max(0, line - context), min(len(lines), line + context + 1)
+        while start > 0 and lines[start - 1].strip() and line - start < REPAIR_MAX_LINES // 2:
+            start -= 1
+        while end < len(lines) and lines[end].strip() and end - line < REPAIR_MAX_LINES // 2:
+            end += 1
+        ranges.append((start, end))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def repair_latex_fragments(latex_code: str, errors: list, use_cache: bool = True) -> str:
+    """ Send only the fragments around the compile errors to Gemini and splice the fixes back in """
+    lines = latex_code.split("\n")
+    fragments = error_fragments(lines, errors)
+    log(f"🩹 Repairing {len(fragments)} fragments with Gemini ({sum(e - s for s, e in fragments)} of {len(lines)} lines)...")
+    gemini = get_gemini()
 
-    for _ in range(2):  # run twice
+    async def repair_all():
+        async def repair_one(start, end):
+            messages = "\n".join(f"- line {e['line']}: {e['message']}" for e in errors if start < e["line"] <= end)
+            fragment = "\n".join(lines[start:end])
+            prompt = f"""
+You are an expert LaTeX engineer. The following fragment (lines {start + 1}-{end} of a document) does not compile.
+
+ERRORS:
+{messages}
+
+FRAGMENT:
+{fragment}
+
+Output ONLY the corrected fragment, covering exactly the same lines and content.
+Change only what is needed to fix the errors. Do not add a preamble, explanations or markdown code blocks.
+"""
+            cache_key = llm_cache_key("repair", prompt)
+            cached = get_llm_cache().get(cache_key) if use_cache else None
+            if cached:
+                return cached["latex"]
+            response = await gemini.generate(prompt, generation_config())
+            if not response.text:
+                return fragment
+            fixed = re.sub(r"^```[a-zA-Z]*\s*|```\s*$", "", response.text.strip()).strip("\n")
+            get_llm_cache().put(cache_key, {"model": model, "latex": fixed})
+            return fixed
+
+        return await asyncio.gather(*[repair_one(s, e) for s, e in fragments])
+
+    fixes = gemini.run(repair_all())
+    # Splice from the end, so earlier line numbers stay valid
+    for (start, end), fixed in reversed(list(zip(fragments, fixes))):
+        lines[start:end] = fixed.split("\n")
+    return "\n".join(lines)
+
+
+def compile_guided_review(tex_path: str, latex_code: str, use_cache: bool = True) -> tuple:
+    """
+    Fast review: compile the draft first and only repair what fails.
+    Returns (latex, compiled); a clean draft costs no LLM request at all.
+    """
+    log("🧪 Compiling the draft before review (fast mode)...")
+    for attempt in range(REPAIR_ROUNDS + 1):
+        result = run_pdflatex(tex_path)
+        if result["ok"]:
+            log("✅ Draft compiles, no review needed." if attempt == 0 else "✅ Repaired draft compiles.")
+            return latex_code, True
+        if attempt == REPAIR_ROUNDS or not gemini_api_key():
+            break
+
+        errors = [e for e in result["errors"] if e["line"] > 0]
+        if not errors:
+            break
+        log(f"   - {len(result['errors'])} compile errors (first: line {errors[0]['line']}: {errors[0]['message']})")
         try:
-            subprocess.run(
-                ["pdflatex", "-interaction=nonstopmode", file_name],
-                check=True, cwd=output_dir, capture_output=True
-            )
+            latex_code = repair_latex_fragments(latex_code, errors, use_cache)
+        except JobCancelled:
+            raise
         except Exception as e:
-            log(f"❌ PDF compilation failed: {e}")
-            return False
+            log(f"⚠️ Error during repair: {e}.")
+            break
+        with open(tex_path, "w", encoding="utf-8") as f:
+            f.write(latex_code)
 
-    log("✅ PDF successfully generated.")
-    return True
+    log("⚠️ Targeted repair did not fix the document, falling back to the full review.")
+    return review_latex_content(latex_code, use_cache), False
 
 
 def cleanup_output(output_dir: str, base_name: str):
@@ -520,11 +2715,13 @@ def cleanup_output(output_dir: str, base_name: str):
     keep_files = [
         f"{base_name}_appunti.tex",
         f"{base_name}_appunti.pdf",
-        f"{base_name}_trascrizione.txt"
+        f"{base_name}_trascrizione.txt",
+        f"{base_name}_timings.json"
     ]
 
     for filename in os.listdir(output_dir):
-        if filename not in keep_files:
+        # cProfile dumps of --profile / PROFILE_STAGES are results too
+        if filename not in keep_files and not fnmatch.fnmatch(filename, "profile_*.prof"):
             try:
                 os.remove(os.path.join(output_dir, filename))
                 log(f"   - Removed temporary file: {filename}")
@@ -534,16 +2731,138 @@ def cleanup_output(output_dir: str, base_name: str):
     log("✔️ Cleanup completed.")
 
 
+# ---------------- PIPELINE ----------------
+class StagePipeline:
+    """
+    Explicit dependency graph of pipeline stages.
+    Each stage starts as soon as the stages it depends on are done, so independent work
+    (e.g. slide slicing and upload) runs while Whisper transcribes.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+
+    def add(self, name: str, fn, deps=(), optional: bool = False):
+        """
+        fn receives a dict with the results of its dependencies.
+        A failing optional stage yields None instead of stopping the pipeline.
+        """
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = {"fn": fn, "deps": tuple(deps), "optional": optional}
+
+    def _call(self, name: str, inputs: dict):
+        check_cancelled()
+        # Named thread: py-spy dumps and profiles show which stage a thread is running
+        thread = threading.current_thread()
+        thread_name, thread.name = thread.name, f"stage:{name}"
+        start = time.time()
+        try:
+            with span(name, stage=True):
+                return self.stages[name]["fn"](inputs)
+        finally:
+            self.timings[name] = time.time() - start
+            thread.name = thread_name
+
+    def run(self) -> dict:
+        """ Run every stage, returns {stage: result}. The first failure of a required stage is raised. """
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        # Stages see their own cancel flag: set by the job's, or by the pipeline when a stage fails
+        scope = CancelScope(_job_cancel.get())
+
+        try:
+            while pending or running:
+                for name in [n for n, st in pending.items() if all(d in results for d in st["deps"])]:
+                    inputs = {d: results[d] for d in pending[name]["deps"]}
+                    # Each stage runs in a copy of the job context (logger, cancellation)
+                    context = contextvars.copy_context()
+                    context.run(_job_cancel.set, scope)
+                    running[executor.submit(context.run, self._call, name, inputs)] = name
+                    del pending[name]
+
+                if not running:
+                    raise RuntimeError(f"Unresolvable stage dependencies: {', '.join(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except JobCancelled:
+                        raise
+                    except Exception as e:
+                        if not self.stages[name]["optional"]:
+                            raise
+                        log(f"⚠️ Stage '{name}' failed ({e}), continuing without it.")
+                        results[name] = None
+        finally:
+            if running:
+                # Stop the stages still running and let them unwind before the caller cleans up under them
+                scope.set()
+                _, still_running = wait(running, timeout=STAGE_STOP_TIMEOUT_SEC)
+                if still_running:
+                    log(f"⚠️ Stages still running after {STAGE_STOP_TIMEOUT_SEC:.0f}s: {', '.join(running[f] for f in still_running)}")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+
 # ---------------- MAIN ----------------
-def main(args_list=None):
+def main(args_list=None, pool: TranscriptionPool = None, transcribe_gate: threading.Semaphore = None):
+    """
+    Run the whole pipeline; pool is an optional warm TranscriptionPool shared across jobs.
+    transcribe_gate (batch mode) lets only one job at a time transcribe on the pool.
+    A directory or glob as file_audio runs the batch mode (see run_batch).
+    Returns True when the PDF was generated.
+    """
     log("🚀 Initializing AudioTTo...")
     start_time = time.time()
 
     parser = argparse.ArgumentParser(description="Transcribes audio and generates LaTeX/PDF notes with optional PDF slides.")
-    parser.add_argument("file_audio", help="Path to the audio file.")
+    parser.add_argument("file_audio", nargs="?", help="Path to the audio file.")
     parser.add_argument("--slides", help="Path to PDF slides.")
-    parser.add_argument("--pages", help="Page range (e.g., '5-12').")
+    parser.add_argument("--pages", help="Pages to use, ranges and single pages (e.g., '5-12' or '1-5,9,12-14').")
     parser.add_argument("--threads", type=int, default=N_THREADS)
+    parser.add_argument("--cpu-threads", type=int, default=None,
+                        help="CTranslate2 threads per worker process (default: calibrated or automatic).")
+    parser.add_argument("--slides-mode", choices=["pdf", "digest", "auto"], default=SLIDES_MODE,
+                        help="'pdf' uploads the slides, 'digest' sends their text plus renders of the visual pages, 'auto' picks the smaller.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached transcriptions (the fresh result still refreshes the cache).")
+    parser.add_argument("--no-llm-cache", action="store_true",
+                        help="Ask Gemini again even if the same draft/review request is cached.")
+    parser.add_argument("--generation", choices=["auto", "single", "sectioned"], default=os.getenv("GENERATION", "auto"),
+                        help="'sectioned' writes and reviews the notes in parallel sections (map-reduce); 'auto' does it for long lectures.")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="Wait for the whole Gemini response instead of streaming it into the .tex file.")
+    parser.add_argument("--review", choices=["full", "fast"], default=os.getenv("REVIEW_MODE", "full"),
+                        help="'full' reviews the whole draft with Gemini; 'fast' compiles it first and only repairs the failing fragments.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted job from the checkpoints in its output folder.")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Measure the best processes x threads layout for --threads, save it and exit.")
+    parser.add_argument("--ingest", choices=["stream", "files"], default="stream",
+                        help="'stream' pipes decoded PCM straight to Whisper, 'files' writes WAV chunks to disk.")
+    parser.add_argument("--engine", choices=["pool", "batched"], default=os.getenv("ENGINE", "pool"),
+                        help="'pool' runs one chunk per worker process, 'batched' uses one model with batched VAD segments.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Segments decoded together by the batched engine.")
+    parser.add_argument("--chunk-minutes", type=float, default=None,
+                        help="Target chunk length (default: sized from duration and threads); boundaries are moved to the nearest silence.")
+    parser.add_argument("--overlap", type=float, default=CHUNK_OVERLAP_SEC,
+                        help="Seconds of audio shared by consecutive chunks (repeated words are removed).")
+    parser.add_argument("--name", default=None,
+                        help="Name of the output folder and files (default: the audio file name).")
+    parser.add_argument("--batch-jobs", type=int, default=BATCH_JOBS,
+                        help="Batch mode (directory or glob as file_audio): files processed at once; Whisper runs one file at a time.")
+    parser.add_argument("--profile", default=None,
+                        help="Run these stages under cProfile (comma separated, e.g. 'draft,pdf', or 'all'); .prof files go to the output folder.")
     
     # If args_list is provided, use it; otherwise, use sys.argv
     if args_list:
@@ -551,59 +2870,182 @@ def main(args_list=None):
     else:
         args = parser.parse_args()
 
+    if args.calibrate:
+        calibrate_topology(args.threads)
+        return
+    if not args.file_audio:
+        parser.error("the following arguments are required: file_audio")
+    if is_batch_spec(args.file_audio):
+        return run_batch(args, list(args_list or sys.argv[1:]), pool)
+
     # Folder creation and variable initialization
-    output_dir = create_output_folder(args.file_audio)
-    base_name = os.path.splitext(os.path.basename(args.file_audio))[0]
+    output_dir = create_output_folder(args.file_audio, args.name)
+    base_name = args.name or os.path.splitext(os.path.basename(args.file_audio))[0]
     temp_files = []
     succeeded = False
-
-    try:
+    cancelled = False
+
+    # Timing records of this job (stages, Whisper chunks, pdflatex runs), saved as <name>_timings.json
+    trace = JobTrace(output_dir, profile=args.profile)
+    trace_token = _job_trace.set(trace)
+
+    # Worker topology: processes x CTranslate2 threads, never more than the physical cores
+    owns_pool = pool is None
+    if owns_pool:
+        pool = TranscriptionPool(*resolve_topology(args.threads, args.cpu_threads))
+    if args.engine == "batched":
+        log(f"🧮 Engine: batched, 1 model x {pool.processes * pool.cpu_threads} threads")
+    else:
+        log(f"🧮 Topology: {pool.processes} worker processes x {pool.cpu_threads} threads")
+
+    # Job manifest: per-chunk checkpoints and completed stages (used by --resume)
+    manifest_path = os.path.join(output_dir, JOB_MANIFEST)
+    manifest = JobManifest.load(manifest_path) if args.resume else None
+    if args.resume and manifest is None:
+        log("⚠️ Nothing to resume, starting a new job.")
+    elif manifest is not None and not manifest.matches(args):
+        log("⚠️ The job manifest belongs to another recording or model. Starting a new job.")
+        manifest = None
+    if manifest is None:
+        manifest = JobManifest.create(manifest_path, args)
+
+    transcript_file = os.path.join(output_dir, f"{base_name}_trascrizione.txt")
+    tex_path = os.path.join(output_dir, f"{base_name}_appunti.tex")
+
+    def slides_stage(_):
         # 1. Slide processing
-        slides_images = process_slides(args.slides, args.pages)
-
-        # 2. Splitting Audio in chunk
-        chunks = split_audio(args.file_audio, CHUNK_LENGTH_MS_LOCAL, output_dir)
-        temp_files.extend(chunks)
-
-        # 3. Transcription (Parallel if multiple chunks)
-        num_workers = min(args.threads, len(chunks)) if chunks else 0
-        transcript, audio_lang = transcribe_chunks_local_parallel(chunks, num_workers)
+        return process_slides(args.slides, args.pages)
+
+    def upload_stage(inputs):
+        # 1b. Slide upload (or local digest), overlapped with transcription
+        if not inputs["slides"] or (manifest.stage("draft") and os.path.exists(tex_path)):
+            return None
+        return prepare_slides(inputs["slides"], args.slides_mode)
+
+    def transcript_stage(_):
+        done = manifest.stage("transcript")
+        if done and os.path.exists(transcript_file):
+            with open(transcript_file, "r", encoding="utf-8") as f:
+                transcript = f.read()
+            log("⏯️ Transcription already completed, skipping.")
+            return transcript, done["language"]
+
+        # 2-3. Transcription (cached by audio content and model settings)
+        cache_key = transcript_cache_key(args.file_audio)
+        cached = None if args.no_cache else get_transcript_cache().get(cache_key)
+        if cached:
+            transcript, audio_lang = cached["text"], cached["language"]
+            log("♻️ Transcription found in cache, skipping Whisper.")
+        else:
+            if transcribe_gate is not None:
+                with span("transcribe_queue"):
+                    while not transcribe_gate.acquire(timeout=1.0):
+                        check_cancelled()
+            try:
+                transcript, audio_lang = transcribe_audio(args, pool, output_dir, temp_files, manifest)
+            finally:
+                if transcribe_gate is not None:
+                    transcribe_gate.release()
+            if transcript.strip():
+                get_transcript_cache().put(cache_key, {"text": transcript, "language": audio_lang})
 
         if not transcript.strip():
             log("⚠️ Transcription is empty. Stopping.")
-            return
+            return None
 
         # 4. Saving transcription text file
-        transcript_file = os.path.join(output_dir, f"{base_name}_trascrizione.txt")
         with open(transcript_file, "w", encoding="utf-8") as f:
             f.write(transcript)
+        manifest.mark_stage("transcript", language=audio_lang)
         log(f"💾 Transcription saved at: {transcript_file}")
+        return transcript, audio_lang
+
+    def draft_stage(inputs):
+        if inputs["transcript"] is None:
+            return None
+        transcript, audio_lang = inputs["transcript"]
         log(f"🌍 Detected language: {audio_lang}")
 
         # 5. LaTeX generation through LLM (Gemini)
-        latex_doc = generate_latex_document(transcript, base_name, slides_images, audio_lang)
-
+        if manifest.stage("draft") and os.path.exists(tex_path):
+            with open(tex_path, "r", encoding="utf-8") as f:
+                latex_doc = f.read()
+            log("⏯️ LaTeX draft already generated, skipping.")
+            return latex_doc
+
+        if use_sectioned(args.generation, transcript):
+            latex_doc = generate_latex_sectioned(transcript, base_name, inputs["slides"], audio_lang, inputs["upload"],
+                                                 use_cache=not args.no_llm_cache)
+        else:
+            latex_doc = generate_latex_document(transcript, base_name, inputs["slides"], audio_lang, inputs["upload"],
+                                                use_cache=not args.no_llm_cache,
+                                                stream_path=None if args.no_stream else tex_path)
         if latex_doc:
-            # 6. Automatic review (Conceptual and Code Validation)
-            latex_doc = review_latex_content(latex_doc)
-            
-            tex_path = os.path.join(output_dir, f"{base_name}_appunti.tex")
             with open(tex_path, "w", encoding="utf-8") as f:
                 f.write(latex_doc)
-
-            log(f"📝 LaTeX file created: {tex_path}")
-
-            # 7. PDF compilation (pdflatex)
-            if compile_pdf(tex_path):
-                succeeded = True
+            manifest.mark_stage("draft")
         else:
             log("❌ Failed to generate LaTeX document (AI response was empty or error).")
+        return latex_doc
+
+    def review_stage(inputs):
+        latex_doc = inputs["draft"]
+        if not latex_doc:
+            return None
+
+        # 6. Automatic review (Conceptual and Code Validation, or compile-guided repair in fast mode)
+        if manifest.stage("review"):
+            log("⏯️ Review already completed, skipping.")
+        elif args.review == "fast":
+            latex_doc, _ = compile_guided_review(tex_path, latex_doc, use_cache=not args.no_llm_cache)
+            with open(tex_path, "w", encoding="utf-8") as f:
+                f.write(latex_doc)
+            manifest.mark_stage("review")
+        else:
+            review = review_latex_sectioned if use_sectioned(args.generation, latex_doc, "review") else review_latex_content
+            latex_doc = review(latex_doc, use_cache=not args.no_llm_cache)
+            with open(tex_path, "w", encoding="utf-8") as f:
+                f.write(latex_doc)
+            manifest.mark_stage("review")
+
+        log(f"📝 LaTeX file created: {tex_path}")
+        return latex_doc
+
+    def pdf_stage(inputs):
+        if not inputs["review"]:
+            return False
+
+        # 7. PDF compilation (pdflatex, reruns only while the table of contents/labels change)
+        if compile_pdf(tex_path):
+            manifest.mark_stage("pdf")
+            return True
+        return False
+
+    pipeline = StagePipeline()
+    pipeline.add("slides", slides_stage)
+    pipeline.add("upload", upload_stage, deps=["slides"], optional=True)
+    pipeline.add("transcript", transcript_stage)
+    pipeline.add("draft", draft_stage, deps=["transcript", "slides", "upload"])
+    pipeline.add("review", review_stage, deps=["draft"])
+    pipeline.add("pdf", pdf_stage, deps=["review"])
+
+    try:
+        results = pipeline.run()
+        succeeded = bool(results["pdf"])
+        log("⏱️ Stages: " + ", ".join(f"{name} {sec:.1f}s" for name, sec in pipeline.timings.items()))
+
+    except JobCancelled:
+        cancelled = True
+        log("🛑 Job cancelled.")
 
     except Exception as e:
         # Generic error capture to avoid silent GUI crashes
         log(f"❌ Critical Error during execution: {e}")
 
     finally:
+        if owns_pool:
+            pool.close()
+
         # 8. Removing intermediate audio files
         log("\n🧹 Removing intermediate audio files...")
         for f_path in temp_files:
@@ -615,7 +3057,7 @@ def main(args_list=None):
 
         # 9. Cleaning LaTeX compilation files
         log("🧹 Cleaning LaTeX compilation files...")
-        for ext in ['.aux', '.log', '.out', '.fls', '.fdb_latexmk']:
+        for ext in ['.aux', '.log', '.out', '.toc', '.fls', '.fdb_latexmk']:
             tmp = os.path.join(output_dir, f"{base_name}_appunti{ext}")
             try:
                 if os.path.exists(tmp):
@@ -628,9 +3070,232 @@ def main(args_list=None):
         if succeeded:
             cleanup_output(output_dir, base_name)
 
+    _job_trace.reset(trace_token)
+    metrics.inc("audiotto_jobs_total", status="done" if succeeded else ("cancelled" if cancelled else "failed"))
+    timings_path = os.path.join(output_dir, f"{base_name}_timings.json")
+    try:
+        trace.save(timings_path)
+        log(f"📊 Timings saved at: {timings_path}")
+    except OSError as e:
+        log(f"⚠️ Could not save the timings: {e}")
+
     total_seconds = int(time.time() - start_time)
     log(f"\n⏱️ Total time: {total_seconds // 60} min {total_seconds % 60} sec")
     log(f"🎉 Process completed. Final files are in: {output_dir}")
+    return succeeded
+
+
+# ---------------- BATCH MODE ----------------
+def is_batch_spec(path: str) -> bool:
+    """ A directory or a glob pattern (and not an existing file) """
+    return not os.path.isfile(path) and (os.path.isdir(path) or any(c in path for c in "*?["))
+
+
+def natural_key(path: str) -> list:
+    """ Sort key putting 'lesson2' before 'lesson10' """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", os.path.basename(path))]
+
+
+def collect_batch_files(spec: str) -> list:
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)
+                 if name.lower().endswith(AUDIO_EXTENSIONS)]
+    else:
+        paths = [p for p in glob.glob(spec) if os.path.isfile(p)]
+    return sorted(paths, key=natural_key)
+
+
+def batch_output_names(files: list) -> list:
+    """
+    Output folder name of each file: its stem, with a numeric suffix when another file of the batch
+    has the same stem (e.g. 'lecture1.mp3' and 'lecture1.m4a'), so they never share a folder.
+    """
+    names, used = [], set()
+    for path in files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name, n = stem, 2
+        while name.lower() in used:
+            name, n = f"{stem}_{n}", n + 1
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _name_tokens(path: str) -> tuple:
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    words = re.findall(r"[a-z0-9]+", stem)
+    numbers = [int(n) for n in re.findall(r"\d+", stem)]
+    return words, numbers
+
+
+def match_slides(audio_path: str, slide_paths: list):
+    """
+    Slides for a recording, matched by file name: same words, then all the words of one name
+    found in the other (the longest wins), then the same first number
+    (e.g. 'lezione_03.mp3' and 'L3 - Intro.pdf').
+    """
+    audio_words, audio_numbers = _name_tokens(audio_path)
+    candidates = [(path, *_name_tokens(path)) for path in slide_paths]
+
+    for path, words, _ in candidates:
+        if words == audio_words:
+            return path
+    contained = [(len(words), path) for path, words, _ in candidates
+                 if words and (set(words) <= set(audio_words) or set(audio_words) <= set(words))]
+    if contained:
+        return max(contained)[1]
+    if audio_numbers:
+        numbered = [path for path, _, numbers in candidates if numbers and numbers[0] == audio_numbers[0]]
+        if len(numbered) == 1:
+            return numbered[0]
+    return None
+
+
+def batch_file_args(args_list: list, spec: str, audio_path: str, slides_path: str, slides_option: bool) -> list:
+    """ The command line of one file: the batch spec replaced by the file, --slides by its matched deck """
+    out, skip = [], False
+    replaced = False
+    for i, arg in enumerate(args_list):
+        if skip:
+            skip = False
+            continue
+        if arg == spec and not replaced:
+            out.append(audio_path)
+            replaced = True
+        elif slides_option and arg == "--slides":
+            skip = True
+        elif slides_option and arg.startswith("--slides="):
+            continue
+        else:
+            out.append(arg)
+    if slides_path:
+        out += ["--slides", slides_path]
+    return out
+
+
+def run_batch(args, args_list: list, pool: TranscriptionPool = None) -> bool:
+    """
+    Process every recording matched by args.file_audio (directory or glob) on one warm pool.
+    Up to --batch-jobs files are in flight: while one file is transcribed, the previous ones
+    go through Gemini and pdflatex. --slides may be a directory, decks are matched by file name.
+    """
+    files = collect_batch_files(args.file_audio)
+    if not files:
+        log(f"❌ No audio files found in: {args.file_audio}")
+        return False
+
+    slides_dir = args.slides if args.slides and os.path.isdir(args.slides) else None
+    slide_paths = []
+    if slides_dir:
+        slide_paths = sorted(os.path.join(slides_dir, n) for n in os.listdir(slides_dir) if n.lower().endswith(".pdf"))
+
+    jobs = []
+    for path, name in zip(files, batch_output_names(files)):
+        slides = match_slides(path, slide_paths) if slides_dir else None
+        file_args = batch_file_args(args_list, args.file_audio, path, slides, bool(slides_dir)) + ["--name", name]
+        jobs.append({"audio": path, "name": name, "slides": slides, "args": file_args})
+
+    log(f"📚 Batch: {len(files)} recordings, {max(1, args.batch_jobs)} in flight.")
+    for job in jobs:
+        deck = f" + {os.path.basename(job['slides'])}" if job["slides"] else (" (no slides matched)" if slides_dir else "")
+        renamed = f" -> output/{job['name']}" if job["name"] != os.path.splitext(os.path.basename(job["audio"]))[0] else ""
+        log(f"   - {os.path.basename(job['audio'])}{deck}{renamed}")
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = TranscriptionPool(*resolve_topology(args.threads, args.cpu_threads))
+    # Load the model once for the whole batch, before the first file needs it
+    pool.warm_up()
+
+    gate = threading.Semaphore(1)
+    cancel_event = _job_cancel.get() or threading.Event()
+    parent_logger = current_logger()
+    output_lock = threading.Lock() # One whole line at a time from the concurrent files
+
+    def run_one(job):
+        name = job["name"]
+
+        def prefixed(msg):
+            text = f"[{name}] {msg}"
+            with output_lock:
+                if parent_logger:
+                    parent_logger(text)
+                else:
+                    print(text, flush=True)
+
+        last_step = [-1]
+
+        def progress(event):
+            # Bar redraws are dropped, one line per BATCH_PROGRESS_STEP percent of transcription
+            if "percent" not in event:
+                return
+            step = int(event["percent"] // BATCH_PROGRESS_STEP)
+            if step > last_step[0]:
+                last_step[0] = step
+                prefixed(f"⏳ Transcription {event['percent']:.0f}% ({event['rtf']}x real time, ETA {event['eta_sec']:.0f}s)")
+
+        job["duration"] = probe_duration(job["audio"])
+        start = time.time()
+        with job_context(logger=prefixed, cancel_event=cancel_event, progress=progress):
+            job["ok"] = bool(main(job["args"], pool=pool, transcribe_gate=gate))
+        job["wall"] = time.time() - start
+
+        timings_path = os.path.join("output", name, f"{name}_timings.json")
+        try:
+            with open(timings_path, "r", encoding="utf-8") as f:
+                job["timings"] = json.load(f)["summary"]
+        except (OSError, ValueError, KeyError):
+            job["timings"] = {}
+
+    start = time.time()
+    executor = ThreadPoolExecutor(max_workers=max(1, args.batch_jobs), thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, run_one, job) for job in jobs]
+        for future, job in zip(futures, jobs):
+            try:
+                future.result()
+            except Exception as e:
+                job["ok"], job["error"] = False, str(e)
+                log(f"❌ {os.path.basename(job['audio'])}: {e}")
+    except KeyboardInterrupt:
+        log("🛑 Batch interrupted, stopping the running files...")
+        cancel_event.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if owns_pool:
+            pool.close()
+
+    print_batch_summary(jobs, time.time() - start)
+    return all(job.get("ok") for job in jobs)
+
+
+def print_batch_summary(jobs: list, wall: float):
+    """ Per-file stage times and the throughput of the whole batch """
+    def seconds(job, name):
+        return job.get("timings", {}).get(name, {}).get("seconds", 0.0)
+
+    def fmt(sec):
+        sec = int(round(sec))
+        return f"{sec // 60}:{sec % 60:02d}"
+
+    log("\n📊 Batch summary")
+    log(f"{'File':<32} {'Audio':>7} {'Whisper':>8} {'Gemini':>8} {'PDF':>7} {'Total':>7} {'RTF':>6}  Status")
+    audio_total = serial_total = 0.0
+    for job in jobs:
+        duration, total = job.get("duration", 0.0), job.get("wall", 0.0)
+        whisper = seconds(job, "transcript") - seconds(job, "transcribe_queue")
+        gemini = seconds(job, "upload") + seconds(job, "draft") + seconds(job, "review")
+        rtf = f"{total / duration:.2f}" if duration else "-"
+        status = "✅" if job.get("ok") else "❌"
+        log(f"{os.path.basename(job['audio'])[:32]:<32} {fmt(duration):>7} {fmt(whisper):>8} {fmt(gemini):>8} "
+            f"{fmt(seconds(job, 'pdf')):>7} {fmt(total):>7} {rtf:>6}  {status}")
+        audio_total += duration
+        serial_total += total
+
+    done = sum(1 for job in jobs if job.get("ok"))
+    log(f"✔️ {done}/{len(jobs)} files in {fmt(wall)} ({fmt(serial_total)} if run one by one), "
+        f"{audio_total / 3600:.2f} h of audio, {audio_total / wall if wall else 0:.1f}x real time.")
 
 
 if __name__ == "__main__":
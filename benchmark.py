@@ -0,0 +1,417 @@
+"""
+End-to-end benchmark of the AudioTTo pipeline on synthetic inputs.
+
+    python benchmark.py run --lengths 60,300 --workers 1,2,4 --output bench.json
+    python benchmark.py run --ingest stream --lengths 600
+    python benchmark.py compare baseline.json bench.json
+
+Both audio ingests are measured: 'stream' (ffmpeg decoded in memory and fed to the
+workers, the default of AudioTTo) and 'files' (split into WAV chunks first).
+Every stage reports wall time, real-time factor (audio stages), peak RSS of this process
+and its worker processes, and the peak bytes in its temp directory. Gemini is replaced by a
+local stub, so only the client overhead (rate limiter, retries, parsing) is measured.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import types
+import shutil
+import asyncio
+import argparse
+import contextlib
+import platform
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+
+# ---------------- CONFIG ----------------
+SAMPLE_SEC = 0.2 # Memory / disk sampling interval
+DEFAULT_LENGTHS = "60,300"
+DEFAULT_THRESHOLD = 0.15 # Relative slowdown reported as a regression
+MIN_DELTA_SEC = 0.05 # ...ignored below this absolute difference (timer noise)
+SLIDE_PAGES = 12
+FORMAT_VERSION = 2 # 2: audio stages are keyed by ingest
+
+
+# ---------------- INPUTS ----------------
+def write_wav(path: str, samples, rate: int):
+    """ 16-bit mono WAV from float samples in [-1, 1] """
+    import numpy as np
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+
+
+def make_audio(AudioTTo, directory: str, seconds: float, fmt: str) -> str:
+    """ Speech-like synthetic recording (see AudioTTo.synthetic_speech), optionally encoded by ffmpeg """
+    wav_path = os.path.join(directory, f"speech_{int(seconds)}s.wav")
+    write_wav(wav_path, AudioTTo.synthetic_speech(seconds, seed=int(seconds)), AudioTTo.SAMPLE_RATE)
+    if fmt == "wav":
+        return wav_path
+    encoded = os.path.splitext(wav_path)[0] + "." + fmt
+    import subprocess
+    subprocess.run([AudioTTo.AudioSegment.converter, "-y", "-i", wav_path, encoded],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.remove(wav_path)
+    return encoded
+
+
+def make_slides(directory: str, pages: int = SLIDE_PAGES) -> str:
+    """ Slide deck alternating text pages and diagram pages (vector drawings) """
+    import fitz
+    path = os.path.join(directory, "slides.pdf")
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page(width=960, height=540)
+        page.insert_text((60, 80), f"Lecture slide {n + 1}", fontsize=32)
+        if n % 3 == 2:
+            for i in range(200):
+                x = 80 + (i * 37) % 800
+                y = 150 + (i * 53) % 330
+                page.draw_rect(fitz.Rect(x, y, x + 20, y + 12), color=(0.2, 0.3, 0.8))
+        else:
+            body = "\n".join(f"- Point {i + 1}: definitions, properties and a worked example" for i in range(8))
+            page.insert_text((60, 140), body, fontsize=18)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def canned_document(transcript: str) -> str:
+    """ LaTeX notes built from the transcript words, standing in for the Gemini answer """
+    words = "".join(c if c.isalnum() or c.isspace() else " " for c in transcript).split()
+    words = words or ["lorem", "ipsum"]
+    paragraphs = [" ".join(words[i:i + 120]) for i in range(0, len(words), 120)]
+    sections = []
+    for i in range(0, len(paragraphs), 4):
+        sections.append(f"\\section{{Part {i // 4 + 1}}}\n" + "\n\n".join(paragraphs[i:i + 4]))
+    return ("\\documentclass{article}\n\\usepackage[utf8]{inputenc}\n\\title{Benchmark}\n"
+            "\\begin{document}\n\\maketitle\n\\tableofcontents\n" + "\n\n".join(sections) + "\n\\end{document}")
+
+
+# ---------------- GEMINI STUB ----------------
+def make_stub_client(AudioTTo, latency: float):
+    """ GeminiClient whose requests answer with the canned document after a fixed latency """
+
+    class StubGemini(AudioTTo.GeminiClient):
+        document = ""
+
+        async def generate(self, contents, config=None, model_name: str = None):
+            async def request():
+                await asyncio.sleep(latency)
+                return types.SimpleNamespace(text=self.document, candidates=[], prompt_feedback=None)
+            return await self.call("generate", request)
+
+        async def stream(self, contents, on_text, config=None, on_restart=None, model_name: str = None):
+            async def request():
+                if on_restart:
+                    on_restart()
+                pieces = [self.document[i:i + 400] for i in range(0, len(self.document), 400)]
+                for piece in pieces:
+                    await asyncio.sleep(latency / max(1, len(pieces)))
+                    on_text(piece)
+            return await self.call("stream", request)
+
+        async def upload(self, path: str, mime_type: str):
+            async def request():
+                await asyncio.sleep(latency)
+                return AudioTTo.types.File(name="files/benchmark", uri="stub://benchmark", mime_type=mime_type)
+            return await self.call("upload", request)
+
+    # No rate limit: the benchmark measures the pipeline, not the quota
+    return StubGemini(os.environ["GEMINI_API_KEY"], rpm=60 * 1000, burst=1000, max_retries=0)
+
+
+# ---------------- MEASUREMENT ----------------
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def tree_rss() -> int:
+    """ Resident bytes of this process and its worker processes (Linux); own peak RSS elsewhere """
+    if os.path.exists("/proc/self/statm"):
+        return process_rss(os.getpid()) + sum(process_rss(p.pid) for p in multiprocessing.active_children())
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return 0
+
+
+def dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+class StageMeter:
+    """ Context manager measuring one stage: wall time plus sampled peak RSS and temp-disk bytes """
+
+    def __init__(self, results: list, name: str, directory: str, audio_sec: float = None, **params):
+        self.results = results
+        self.record = {"stage": name, **params}
+        self.audio_sec = audio_sec
+        self.directory = directory
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, tree_rss())
+        self.peak_disk = max(self.peak_disk, dir_bytes(self.directory))
+
+    def _sampler(self):
+        while not self._stop.wait(SAMPLE_SEC):
+            self._sample()
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._sample()
+        self._thread = threading.Thread(target=self._sampler, daemon=True)
+        self._thread.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self.record.update({
+            "wall_sec": round(wall, 4),
+            "rtf": round(wall / self.audio_sec, 4) if self.audio_sec else None,
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+            "temp_disk_bytes": self.peak_disk,
+            "ok": exc_type is None
+        })
+        if self.audio_sec:
+            self.record["audio_sec"] = self.audio_sec
+        self.results.append(self.record)
+        label = self.record["stage"] + (f" ({self.record['ingest']})" if self.record.get("ingest") else "")
+        line = f"{label:<22} {wall:8.2f}s"
+        if self.audio_sec:
+            line += f"  RTF {wall / self.audio_sec:.3f}"
+        print(line + f"  RSS {self.record['peak_rss_mb']:.0f} MB  disk {self.peak_disk / 2 ** 20:.1f} MB", file=sys.stderr, flush=True)
+        return False
+
+
+def stage_key(record: dict) -> str:
+    params = ",".join(f"{k}={record[k]}" for k in ("audio_sec", "workers", "ingest", "mode") if record.get(k) is not None)
+    return f"{record['stage']}[{params}]" if params else record["stage"]
+
+
+# ---------------- RUN ----------------
+def parse_list(value: str) -> list:
+    return [float(v) if "." in v else int(v) for v in value.split(",") if v.strip()]
+
+
+def decode_stream(AudioTTo, audio: str) -> int:
+    """ Pull every window out of the streaming decoder, returns the decoded samples """
+    with contextlib.closing(AudioTTo.decode_audio_stream(audio, AudioTTo.STREAM_READ_SEC)) as windows:
+        return sum(len(window) for window in windows)
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="audiotto-bench-", dir=args.workdir)
+    # Caches and the API key are read when AudioTTo is imported: keep both inside the benchmark
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    import AudioTTo
+
+    AudioTTo.gemini_client = make_stub_client(AudioTTo, args.gemini_latency)
+    lengths = parse_list(args.lengths)
+    workers = parse_list(args.workers) if args.workers else sorted({1, 2, AudioTTo.physical_core_count()})
+    ingests = ["stream", "files"] if args.ingest == "both" else [args.ingest]
+    results = []
+    quiet = None if args.verbose else (lambda *a, **k: None)
+
+    print(f"📁 Work directory: {workdir}", file=sys.stderr)
+    try:
+        with AudioTTo.job_context(logger=quiet):
+            inputs = os.path.join(workdir, "inputs")
+            os.makedirs(inputs)
+            slides = make_slides(inputs)
+            with StageMeter(results, "slides", os.path.join(workdir, "slides"), mode="digest"):
+                digest = AudioTTo.prepare_slides(slides, "digest")
+
+            transcript, language = "", None
+            audios, split = {}, {}
+            for seconds in lengths:
+                audio = make_audio(AudioTTo, inputs, seconds, args.format)
+                # Same chunk length for both ingests, so their transcribe stages compare like for like
+                chunk_sec = AudioTTo.plan_unit_seconds(seconds, max(workers))
+                audios[seconds] = (audio, chunk_sec)
+                if "stream" in ingests:
+                    # Nothing is written by the stream ingest: its directory stays empty unless that regresses
+                    with StageMeter(results, "decode", os.path.join(workdir, f"stream_{seconds}"), audio_sec=seconds, ingest="stream"):
+                        decode_stream(AudioTTo, audio)
+                if "files" in ingests:
+                    chunk_dir = os.path.join(workdir, f"split_{seconds}")
+                    with StageMeter(results, "split_audio", chunk_dir, audio_sec=seconds, ingest="files"):
+                        split[seconds] = (chunk_dir, AudioTTo.split_audio(audio, int(chunk_sec * 1000), chunk_dir))
+
+            for n in workers:
+                pool = AudioTTo.TranscriptionPool(n)
+                try:
+                    # Model loading is reported apart, every length is transcribed on the same warm pool
+                    with StageMeter(results, "warm_up", workdir, workers=n):
+                        pool.warm_up()
+                    for seconds, (audio, chunk_sec) in audios.items():
+                        if "stream" in ingests:
+                            with StageMeter(results, "transcribe", os.path.join(workdir, f"stream_{seconds}"), audio_sec=seconds, workers=n, ingest="stream"):
+                                transcript, language = AudioTTo.transcribe_stream_local_parallel(audio, n, chunk_sec, pool=pool)
+                        if "files" in ingests:
+                            chunk_dir, chunks = split[seconds]
+                            with StageMeter(results, "transcribe", chunk_dir, audio_sec=seconds, workers=n, ingest="files"):
+                                transcript, language = AudioTTo.transcribe_chunks_local_parallel(chunks, n, pool=pool)
+                finally:
+                    pool.close()
+
+            AudioTTo.gemini_client.document = canned_document(transcript)
+            gen_dir = os.path.join(workdir, "latex")
+            tex_path = os.path.join(gen_dir, "notes.tex")
+            with StageMeter(results, "generate", gen_dir, mode="stream"):
+                AudioTTo.generate_latex_document(transcript, "Benchmark", slides, language or "en", uploaded_file=digest,
+                                                 use_cache=False, stream_path=tex_path)
+            with StageMeter(results, "generate", gen_dir, mode="single"):
+                latex = AudioTTo.generate_latex_document(transcript, "Benchmark", slides, language or "en",
+                                                         uploaded_file=digest, use_cache=False)
+            with StageMeter(results, "review", gen_dir, mode="full"):
+                latex = AudioTTo.review_latex_content(latex, use_cache=False) or latex
+
+            if shutil.which("pdflatex"):
+                with open(tex_path, "w", encoding="utf-8") as f:
+                    f.write(latex)
+                with StageMeter(results, "compile_pdf", gen_dir):
+                    AudioTTo.compile_pdf(tex_path)
+            else:
+                print("⚠️ pdflatex not found, compile_pdf skipped.", file=sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "version": FORMAT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count()
+        },
+        "config": {
+            "lengths": lengths,
+            "workers": workers,
+            "ingest": ingests,
+            "format": args.format,
+            "gemini_latency": args.gemini_latency,
+            "model": AudioTTo.MODEL_SIZE
+        },
+        "stages": results
+    }
+
+
+# ---------------- COMPARE ----------------
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """ Stages slower (or heavier in memory) than the baseline by more than threshold """
+    if baseline.get("version") != current.get("version"):
+        print(f"⚠️ Report formats differ (v{baseline.get('version')} vs v{current.get('version')}): renamed stages show as new.")
+    base = {stage_key(r): r for r in baseline["stages"]}
+    regressions = []
+    print(f"{'stage':<52} {'baseline':>10} {'current':>10} {'change':>8}")
+    for record in current["stages"]:
+        key = stage_key(record)
+        old = base.get(key)
+        if old is None:
+            print(f"{key:<52} {'-':>10} {record['wall_sec']:>9.2f}s {'new':>8}")
+            continue
+        change = (record["wall_sec"] - old["wall_sec"]) / old["wall_sec"] if old["wall_sec"] else 0.0
+        slower = change > threshold and record["wall_sec"] - old["wall_sec"] > MIN_DELTA_SEC
+        heavier = old["peak_rss_mb"] and record["peak_rss_mb"] > old["peak_rss_mb"] * (1 + threshold)
+        flag = ""
+        if slower:
+            flag += "  ⚠️ slower"
+        if heavier:
+            flag += f"  ⚠️ RSS {old['peak_rss_mb']:.0f} -> {record['peak_rss_mb']:.0f} MB"
+        if not record.get("ok", True) and old.get("ok", True):
+            flag += "  ❌ failed"
+        if flag:
+            regressions.append(key)
+        print(f"{key:<52} {old['wall_sec']:>9.2f}s {record['wall_sec']:>9.2f}s {change:>+7.0%}{flag}")
+    return regressions
+
+
+def load_report(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(args_list=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the AudioTTo pipeline on synthetic audio and slides.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmark and write a JSON report.")
+    run_parser.add_argument("--lengths", default=DEFAULT_LENGTHS, help="Audio lengths in seconds (comma separated).")
+    run_parser.add_argument("--workers", default=None, help="Worker counts to transcribe with (default: 1, 2 and the physical cores).")
+    run_parser.add_argument("--ingest", default="both", choices=["both", "stream", "files"], help="Audio ingest(s) to measure.")
+    run_parser.add_argument("--format", default="wav", choices=["wav", "mp3", "ogg", "flac"], help="Container of the synthetic audio.")
+    run_parser.add_argument("--gemini-latency", type=float, default=0.0, help="Seconds the Gemini stub waits per request.")
+    run_parser.add_argument("--output", "-o", default=None, help="Write the JSON report here (default: stdout).")
+    run_parser.add_argument("--baseline", default=None, help="Compare the run against this report.")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative change flagged as a regression.")
+    run_parser.add_argument("--workdir", default=None, help="Parent directory of the temporary files.")
+    run_parser.add_argument("--keep", action="store_true", help="Keep the temporary files.")
+    run_parser.add_argument("--verbose", action="store_true", help="Show the pipeline log.")
+
+    compare_parser = sub.add_parser("compare", help="Compare two JSON reports.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative change flagged as a regression.")
+
+    args = parser.parse_args(args_list)
+
+    if args.command == "compare":
+        current = load_report(args.current)
+        baseline = load_report(args.baseline)
+    else:
+        current = run(args)
+        report = json.dumps(current, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(report)
+            print(f"💾 Report saved at: {args.output}")
+        elif not args.baseline:
+            print(report)
+        if not args.baseline:
+            return 0
+        baseline = load_report(args.baseline)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("✅ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
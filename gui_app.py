@@ -1,14 +1,22 @@
 import os
+import re
 import sys
 import shutil
+import time
+import uuid
+import hashlib
 import asyncio
 import threading
 import multiprocessing
 import webbrowser
-from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
+from contextlib import asynccontextmanager
+from collections import OrderedDict, deque
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, Body, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from typing import Optional
 from dotenv import load_dotenv
 import uvicorn
 
@@ -36,11 +44,57 @@ def safe_print(msg):
         pass
 
 
+# ------------------------------------------------------------
+# WARM TRANSCRIPTION POOL
+# ------------------------------------------------------------
+POOL_HEALTH_INTERVAL = 300
+
+
+def get_pool():
+    """Shared Whisper pool, created on first use and reused by every job"""
+    import AudioTTo
+    return AudioTTo.get_shared_pool(int(os.getenv("THREADS", "4")))
+
+
+def loaded_pool():
+    """Shared pool if one is running (never triggers the heavy AudioTTo import)"""
+    module = sys.modules.get("AudioTTo")
+    return module.shared_pool if module else None
+
+
+def preload_pool():
+    import AudioTTo
+    AudioTTo.get_shared_pool(int(os.getenv("THREADS", "4")), preload=True)
+
+
+async def pool_health_loop():
+    while True:
+        await asyncio.sleep(POOL_HEALTH_INTERVAL)
+        pool = loaded_pool()
+        if pool is not None:
+            await asyncio.to_thread(pool.ensure_healthy)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Optionally load the Whisper model in every worker before the first job
+    if os.getenv("PRELOAD_MODEL", "0") == "1":
+        threading.Thread(target=preload_pool, daemon=True).start()
+    health_task = asyncio.create_task(pool_health_loop())
+    upload_task = asyncio.create_task(upload_sweep_loop())
+    yield
+    health_task.cancel()
+    upload_task.cancel()
+    pool = loaded_pool()
+    if pool is not None:
+        pool.close()
+
+
 # ------------------------------------------------------------
 # FASTAPI SETUP
 # ------------------------------------------------------------
 load_dotenv()
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 def resource_path(relative_path):
@@ -60,6 +114,96 @@ os.makedirs("temp_uploads", exist_ok=True)
 app.mount("/static", StaticFiles(directory=web_folder), name="static")
 
 
+# ------------------------------------------------------------
+# OUTPUT CATALOG
+# ------------------------------------------------------------
+CATALOG_RESCAN_SEC = 300
+
+
+def file_etag(stat):
+    return '"' + hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode()).hexdigest() + '"'
+
+
+class OutputCatalog:
+    """Index of the PDFs under output/, updated one folder at a time as jobs finish.
+
+    The full os.walk only runs on first use, when output/ itself changed (a folder added or
+    removed outside the GUI) or every CATALOG_RESCAN_SEC as a fallback for edits inside folders.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        self.scanned_at = 0.0
+        self._root_mtime = None
+        self._lock = threading.Lock()
+
+    def _root_stamp(self):
+        try:
+            return os.stat(self.root).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(self, top):
+        found = {}
+        for root, _, filenames in os.walk(top):
+            for f in filenames:
+                if not f.endswith(".pdf"):
+                    continue
+                full = os.path.join(root, f)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                rel = os.path.relpath(full, self.root).replace("\\", "/")
+                found[rel] = {
+                    "filename": f,
+                    "path": rel,
+                    "folder": os.path.basename(root),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime
+                }
+        return found
+
+    def stale(self):
+        return (
+            self._root_mtime is None
+            or self._root_stamp() != self._root_mtime
+            or time.time() - self.scanned_at > CATALOG_RESCAN_SEC
+        )
+
+    def rescan(self):
+        stamp = self._root_stamp()
+        entries = self._scan(self.root)
+        with self._lock:
+            self.entries = entries
+            self._root_mtime = stamp
+            self.scanned_at = time.time()
+
+    def update_folder(self, folder):
+        """Re-index a single output folder (called when a job writing into it ends)"""
+        prefix = folder.replace("\\", "/").rstrip("/") + "/"
+        found = self._scan(os.path.join(self.root, folder))
+        with self._lock:
+            for rel in [rel for rel in self.entries if rel.startswith(prefix)]:
+                del self.entries[rel]
+            self.entries.update(found)
+            if self._root_mtime is not None:
+                # A new folder bumps the root mtime; it is indexed already, no need for a full rescan
+                self._root_mtime = self._root_stamp()
+
+    def page(self, offset=0, limit=None, sort="date", descending=True):
+        with self._lock:
+            entries = list(self.entries.values())
+        key = (lambda e: e["mtime"]) if sort == "date" else (lambda e: e["path"].lower())
+        entries.sort(key=key, reverse=descending)
+        end = None if limit is None else offset + max(0, limit)
+        return len(entries), entries[offset:end]
+
+
+output_catalog = OutputCatalog("output")
+
+
 # ------------------------------------------------------------
 # ROUTES
 # ------------------------------------------------------------
@@ -70,39 +214,53 @@ async def index():
     return FileResponse(os.path.join(web_folder, "index.html"))
 
 
-# Outputs (folder where appunti.pdf is saved)
+# Outputs (folder where appunti.pdf is saved), newest first by default
 @app.get("/outputs")
-async def list_outputs():
-    files = []
-    for root, _, filenames in os.walk("output"):
-        for f in filenames:
-            if f.endswith(".pdf"):
-                full = os.path.join(root, f)
-                rel = os.path.relpath(full, "output").replace("\\", "/")
-                files.append({
-                    "filename": f,
-                    "path": rel,
-                    "folder": os.path.basename(root)
-                })
-    return JSONResponse(content=files)
+async def list_outputs(offset: int = 0, limit: Optional[int] = None, sort: str = "date", order: Optional[str] = None, refresh: bool = False):
+    if sort not in ("date", "name"):
+        return JSONResponse(status_code=400, content={"message": "sort must be 'date' or 'name'"})
+    if refresh or output_catalog.stale():
+        await asyncio.to_thread(output_catalog.rescan)
+    descending = (order or ("desc" if sort == "date" else "asc")) == "desc"
+    total, files = output_catalog.page(max(0, offset), limit, sort, descending)
+    return JSONResponse(content=files, headers={"X-Total-Count": str(total)})
+
+
+def serve_pdf(request, folder, name, **kwargs):
+    """FileResponse with a validator pair; answers 304 when the client copy is current.
+    Range requests (partial loads in the PDF viewer) are handled by FileResponse itself."""
+    path = os.path.join("output", folder, name)
+    if not os.path.isfile(path):
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {"etag": etag, "last-modified": last_modified, "cache-control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    else:
+        since = request.headers.get("if-modified-since")
+        try:
+            not_modified = since is not None and int(stat.st_mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, stat_result=stat, headers=headers, **kwargs)
 
 
 # View PDF (open in browser)
 @app.get("/view/{folder}/{filename}")
-async def view_pdf(folder: str, filename: str):
-    path = os.path.join("output", folder, filename)
-    if os.path.exists(path):
-        return FileResponse(path, media_type="application/pdf", content_disposition_type="inline")
-    return JSONResponse(status_code=404, content={"message": "Not found"})
+async def view_pdf(request: Request, folder: str, filename: str):
+    return serve_pdf(request, folder, filename, media_type="application/pdf", content_disposition_type="inline")
 
 
 # Download PDF (download from browser)
 @app.get("/download/{folder}/{filename}")
-async def download_pdf(folder: str, filename: str):
-    path = os.path.join("output", folder, filename)
-    if os.path.exists(path):
-        return FileResponse(path, filename=filename)
-    return JSONResponse(status_code=404, content={"message": "Not found"})
+async def download_pdf(request: Request, folder: str, filename: str):
+    return serve_pdf(request, folder, filename, filename=filename)
 
 
 # ------------------------------------------------------------
@@ -151,57 +309,745 @@ async def save_key(req: ApiKeyRequest):
 
 class ThreadConfig(BaseModel):
     threads: int
+    cpu_threads: Optional[int] = None
+
+
+def topology_info(threads):
+    import AudioTTo
+    return AudioTTo.topology_info(threads)
 
 
 # Get app info
 @app.get("/api/info")
 async def app_info():
+    saved_threads = int(os.getenv("THREADS", "4"))
     return {
         "cpu_count": multiprocessing.cpu_count(),
-        "saved_threads": int(os.getenv("THREADS", "4"))
+        "saved_threads": saved_threads,
+        "topology": await asyncio.to_thread(topology_info, saved_threads)
     }
 
 
-# Save threads
+def apply_topology(threads):
+    """Reshape the warm pool (if running) to the layout for the given budget"""
+    pool = loaded_pool()
+    if pool is not None:
+        import AudioTTo
+        pool.resize(*AudioTTo.resolve_topology(threads))
+
+
+# Save threads (and optionally the CTranslate2 threads per worker, 0 = auto)
 @app.post("/api/save-threads")
 async def save_threads(cfg: ThreadConfig):
-    env_path = ".env"
-    lines = []
-
-    if os.path.exists(env_path):
-        with open(env_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+    import AudioTTo
 
-    found = False
-    out = []
-    for l in lines:
-        if l.startswith("THREADS="):
-            out.append(f"THREADS={cfg.threads}\n")
-            found = True
-        else:
-            out.append(l)
+    values = {"THREADS": cfg.threads}
+    if cfg.cpu_threads is not None:
+        values["CPU_THREADS"] = cfg.cpu_threads
+        AudioTTo.CPU_THREADS = cfg.cpu_threads
+    AudioTTo.save_env_values(values)
 
-    if not found:
-        out.append(f"THREADS={cfg.threads}\n")
+    apply_topology(cfg.threads)
+    return {"message": "Threads saved", "topology": await asyncio.to_thread(topology_info, cfg.threads)}
 
-    with open(env_path, "w", encoding="utf-8") as f:
-        f.writelines(out)
 
-    os.environ["THREADS"] = str(cfg.threads)
-    return {"message": "Threads saved"}
+# Measure the best processes x threads layout and save it
+@app.post("/api/calibrate")
+async def calibrate():
+    import AudioTTo
+    threads = int(os.getenv("THREADS", "4"))
+    result = await asyncio.to_thread(AudioTTo.calibrate_topology, threads)
+    apply_topology(threads)
+    return result
+
+
+# Warm pool status
+@app.get("/api/pool")
+async def pool_status():
+    pool = loaded_pool()
+    if pool is None:
+        return {"running": False}
+    return {"running": True, **pool.status()}
+
+
+# Gemini client counters (latency, errors, retries, rate limiting)
+@app.get("/api/gemini")
+async def gemini_status():
+    module = sys.modules.get("AudioTTo")
+    client = module.gemini_client if module else None
+    if client is None:
+        return {"active": False}
+    return {"active": True, "rpm": client.rpm, "calls": client.metrics()}
+
+
+# Prometheus metrics: job queue and pool gauges, plus the span/Gemini histograms of AudioTTo once loaded
+@app.get("/metrics")
+async def prometheus_metrics():
+    counts = {status: 0 for status in ("queued", "running", "done", "failed", "cancelled")}
+    for job in job_manager.jobs.values():
+        counts[job.status] = counts.get(job.status, 0) + 1
+    lines = ["# TYPE audiotto_jobs gauge"]
+    lines += [f'audiotto_jobs{{status="{status}"}} {count}' for status, count in counts.items()]
+
+    pool = loaded_pool()
+    if pool is not None:
+        status = pool.status()
+        lines += [
+            "# TYPE audiotto_pool_processes gauge", f"audiotto_pool_processes {status['processes']}",
+            "# TYPE audiotto_pool_active_jobs gauge", f"audiotto_pool_active_jobs {status['active_jobs']}",
+            "# TYPE audiotto_pool_restarts_total counter", f"audiotto_pool_restarts_total {status['restarts']}"
+        ]
+
+    text = "\n".join(lines) + "\n"
+    module = sys.modules.get("AudioTTo")
+    if module is not None:
+        text += module.metrics.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
 
 # ------------------------------------------------------------
 # FILE UPLOAD
 # ------------------------------------------------------------
 
-# Upload file
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_IDLE_SEC = int(os.getenv("UPLOAD_IDLE_SEC", "3600")) # Abandoned chunked uploads are discarded after this
+UPLOAD_SWEEP_INTERVAL = 300
+
+
+# Upload file (single request)
 @app.post("/upload")
 async def upload(file: UploadFile = File(...)):
-    path = os.path.join("temp_uploads", file.filename)
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    return {"filename": file.filename}
+    path = os.path.join("temp_uploads", os.path.basename(file.filename))
+
+    def save():
+        with open(path, "wb") as f:
+            shutil.copyfileobj(file.file, f, UPLOAD_CHUNK_SIZE)
+
+    # Copy off the event loop, so other websockets keep streaming during large uploads
+    await asyncio.to_thread(save)
+    return {"filename": os.path.basename(path)}
+
+
+class UploadSession:
+    """A chunked upload written to a .part file, optionally transcoded while the bytes arrive"""
+
+    def __init__(self, upload_id, filename, size, transcode):
+        self.id = upload_id
+        self.filename = os.path.basename(filename)
+        self.size = size
+        self.part_path = os.path.join("temp_uploads", f"{upload_id}.part")
+        self.lock = asyncio.Lock()
+        self.transcoder = None
+        self.transcode = transcode
+        self.touched = time.time()
+
+    @property
+    def offset(self):
+        return os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+
+    def append(self, data):
+        if self.transcode and self.transcoder is None and self.offset == 0 and not self.filename.lower().endswith(".wav"):
+            import AudioTTo
+            if AudioTTo.StreamTranscoder.supports(self.filename):
+                self.transcoder = AudioTTo.StreamTranscoder(os.path.join("temp_uploads", f"{self.id}.16k.wav"))
+        with open(self.part_path, "ab") as f:
+            f.write(data)
+        if self.transcoder is not None:
+            self.transcoder.feed(data)
+        self.touched = time.time()
+
+    def discard(self):
+        """Stop the early transcode and delete what was received so far"""
+        if self.transcoder is not None:
+            self.transcoder.abort()
+        for path in (self.part_path, os.path.join("temp_uploads", f"{self.id}.16k.wav")):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def info(self):
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+            "transcoding": self.transcoder is not None and not self.transcoder.failed
+        }
+
+
+upload_sessions = {}
+completed_uploads = {}  # upload id (client key|name|size) -> content hash of the finished upload
+
+
+async def expire_upload_sessions(idle_sec=UPLOAD_IDLE_SEC):
+    """Discard the chunked uploads nobody has touched for idle_sec (skipping any busy with a chunk)"""
+    now = time.time()
+    for upload_id, session in list(upload_sessions.items()):
+        if now - session.touched < idle_sec or session.lock.locked():
+            continue
+        async with session.lock:
+            if upload_sessions.get(upload_id) is not session:
+                continue
+            del upload_sessions[upload_id]
+            await asyncio.to_thread(session.discard)
+        safe_print(f"🧹 Discarded abandoned upload: {session.filename}")
+
+
+async def upload_sweep_loop():
+    while True:
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
+        await expire_upload_sessions()
+
+
+def is_sha256(digest):
+    return isinstance(digest, str) and re.fullmatch(r"[0-9a-f]{64}", digest) is not None
+
+
+def find_upload(digest):
+    """Completed upload with this content hash (temp_uploads/<hash>/), preferring its transcoded WAV"""
+    if not is_sha256(digest):
+        return None
+    folder = os.path.join("temp_uploads", digest[:16])
+    if not os.path.isdir(folder):
+        return None
+    names = sorted(os.listdir(folder), key=lambda n: not n.lower().endswith(".wav"))
+    return f"{digest[:16]}/{names[0]}" if names else None
+
+
+def finish_upload(session):
+    """Hash the assembled file, de-duplicate it and settle the early transcode; returns (name, deduplicated, hash)"""
+    import AudioTTo
+
+    digest = AudioTTo.hash_file(session.part_path)
+    transcoded = session.transcoder.finish() if session.transcoder is not None else False
+    wav_tmp = os.path.join("temp_uploads", f"{session.id}.16k.wav")
+
+    existing = find_upload(digest)
+    if existing:
+        os.remove(session.part_path)
+        if transcoded:
+            os.remove(wav_tmp)
+        return existing, True, digest
+
+    # Keep the original name inside a per-hash folder, so output folders stay named after the recording
+    folder = os.path.join("temp_uploads", digest[:16])
+    os.makedirs(folder, exist_ok=True)
+    os.replace(session.part_path, os.path.join(folder, session.filename))
+    if transcoded:
+        wav_name = os.path.splitext(session.filename)[0] + ".wav"
+        os.replace(wav_tmp, os.path.join(folder, wav_name))
+        return f"{digest[:16]}/{wav_name}", False, digest
+    return f"{digest[:16]}/{session.filename}", False, digest
+
+
+# Start or resume a chunked upload
+@app.post("/api/uploads")
+async def create_upload(data: dict = Body(...)):
+    filename = data.get("filename")
+    size = data.get("size")
+    if not filename or not isinstance(size, int) or size < 0:
+        return JSONResponse(status_code=400, content={"message": "filename and size are required"})
+
+    # Content hash known up front: skip the transfer if the file is already here
+    digest = data.get("sha256")
+    if digest is not None and not is_sha256(digest):
+        return JSONResponse(status_code=400, content={"message": "sha256 must be a lowercase hex SHA-256 digest"})
+    if digest:
+        existing = await asyncio.to_thread(find_upload, digest)
+        if existing:
+            return {"complete": True, "filename": existing, "deduplicated": True}
+
+    # Same file from the same client maps to the same session, so a dropped upload resumes where it stopped
+    key = f"{data.get('key', '')}|{os.path.basename(filename)}|{size}"
+    upload_id = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    # ...and a file already uploaded in full is answered from its hash without sending it again
+    if data.get("key") and upload_id in completed_uploads:
+        existing = await asyncio.to_thread(find_upload, completed_uploads[upload_id])
+        if existing:
+            return {"complete": True, "filename": existing, "deduplicated": True}
+        del completed_uploads[upload_id]
+
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        session = UploadSession(upload_id, filename, size, bool(data.get("transcode")))
+        upload_sessions[upload_id] = session
+    session.touched = time.time()
+    return {"complete": False, **session.info()}
+
+
+# Upload status (offset to resume from)
+@app.get("/api/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+    return session.info()
+
+
+# Append a chunk at the given offset
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = 0):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+
+    async with session.lock:
+        if offset != session.offset:
+            return JSONResponse(status_code=409, content=session.info())
+        data = await request.body()
+        if session.offset + len(data) > session.size:
+            return JSONResponse(status_code=400, content={"message": "Chunk exceeds the declared size"})
+        await asyncio.to_thread(session.append, data)
+        return session.info()
+
+
+# Abandon a chunked upload
+@app.delete("/api/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+
+    async with session.lock:
+        if upload_sessions.pop(upload_id, None) is session:
+            await asyncio.to_thread(session.discard)
+    return {"message": "Upload discarded"}
+
+
+# Finish a chunked upload
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+
+    async with session.lock:
+        if session.offset != session.size:
+            return JSONResponse(status_code=409, content=session.info())
+        filename, deduplicated, digest = await asyncio.to_thread(finish_upload, session)
+        del upload_sessions[upload_id]
+        completed_uploads[upload_id] = digest
+    return {"complete": True, "filename": filename, "deduplicated": deduplicated}
+
+
+# ------------------------------------------------------------
+# RESUMABLE JOBS
+# ------------------------------------------------------------
+def load_manifest(folder):
+    import AudioTTo
+    return AudioTTo.JobManifest.load(os.path.join("output", os.path.basename(folder), AudioTTo.JOB_MANIFEST))
+
+
+def list_resumable(skip_active=True):
+    """Jobs whose manifest exists but never reached the PDF stage (minus the ones queued or running now)"""
+    active = job_manager.active_folders() if skip_active else set()
+    jobs = []
+    for folder in sorted(os.listdir("output")):
+        if folder in active:
+            continue
+        manifest = load_manifest(folder)
+        if manifest is None or manifest.stage("pdf"):
+            continue
+        jobs.append({
+            "folder": folder,
+            "audio": os.path.basename(manifest.data["audio"]),
+            "audio_available": os.path.exists(manifest.data["audio"]),
+            "chunks_done": len(manifest.data["chunks"]),
+            "stages": list(manifest.data["stages"]),
+            "updated": manifest.data["updated"]
+        })
+    return jobs
+
+
+# List interrupted jobs
+@app.get("/api/resumable")
+async def resumable_jobs():
+    return JSONResponse(content=await asyncio.to_thread(list_resumable))
+
+
+def cleanup_temp_uploads():
+    """Remove uploads, except the inputs of jobs that can still be resumed"""
+    if not os.path.exists("temp_uploads"):
+        return
+    keep = set()
+    try:
+        for job in list_resumable(skip_active=False):
+            manifest = load_manifest(job["folder"])
+            keep.add(os.path.abspath(manifest.data["audio"]))
+            if manifest.data["args"].get("slides"):
+                keep.add(os.path.abspath(manifest.data["args"]["slides"]))
+    except Exception:
+        pass
+
+    for name in os.listdir("temp_uploads"):
+        path = os.path.join("temp_uploads", name)
+        if any(k == os.path.abspath(path) or k.startswith(os.path.abspath(path) + os.sep) for k in keep):
+            continue
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except:
+            pass
+
+
+# ------------------------------------------------------------
+# JOB MANAGER
+# ------------------------------------------------------------
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "1"))
+JOB_LOG_LINES = 500
+JOB_HISTORY = 100
+WS_FRAME_SEC = 0.2
+WS_CHANNEL_LINES = 200
+
+
+class EventChannel:
+    """Bounded buffer between a job thread and one websocket.
+
+    Log lines are batched into one frame every WS_FRAME_SEC, progress events are merged so only
+    the latest one is sent, and when the client falls behind the oldest lines are dropped and
+    reported as a count instead of piling up in memory.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self._lines = deque(maxlen=WS_CHANNEL_LINES)
+        self._progress = None
+        self._dropped = 0
+        self._signalled = False
+        self._lock = threading.Lock()
+
+    def push_log(self, msg):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(msg)
+            self._signal()
+
+    def push_progress(self, event):
+        with self._lock:
+            self._progress = {**(self._progress or {}), **event}
+            self._signal()
+
+    def _signal(self):
+        # Wake the sender once per frame, not once per message
+        if not self._signalled:
+            self._signalled = True
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    def take(self):
+        """Drain the buffer into the JSON events of the next frame"""
+        with self._lock:
+            events = []
+            if self._dropped:
+                events.append({"type": "dropped", "count": self._dropped})
+            if self._lines:
+                events.append({"type": "log", "lines": list(self._lines)})
+            if self._progress:
+                events.append({"type": "progress", **self._progress})
+            self._lines.clear()
+            self._progress = None
+            self._dropped = 0
+            self._signalled = False
+            self.ready.clear()
+        return events
+
+
+def upload_path(name):
+    """Path of an uploaded file; names may include the content-hash folder but never leave temp_uploads"""
+    rel = os.path.normpath(name)
+    if os.path.isabs(rel) or rel.startswith(".."):
+        raise ValueError(f"Invalid file name: {name}")
+    return os.path.join("temp_uploads", rel)
+
+
+async def build_job_args(data):
+    """Translate a job request (uploaded file names or a folder to resume) into AudioTTo arguments"""
+    audio = data.get("audio_filename")
+    slides = data.get("slides_filename")
+    pages = data.get("pages")
+    threads = data.get("threads")
+    engine = data.get("engine")
+    resume_folder = data.get("resume_folder")
+
+    if resume_folder:
+        # Resume an interrupted job with the settings saved in its manifest
+        manifest = await asyncio.to_thread(load_manifest, resume_folder)
+        if manifest is None:
+            raise ValueError("Nothing to resume")
+        saved = manifest.data["args"]
+        audio_path = manifest.data["audio"]
+        slides_path = saved.get("slides")
+        pages = saved.get("pages")
+        threads = threads or saved.get("threads")
+        engine = engine or saved.get("engine")
+    elif audio:
+        audio_path = upload_path(audio)
+        slides_path = upload_path(slides) if slides else None
+    else:
+        raise ValueError("No audio file")
+
+    if not os.getenv("GEMINI_API_KEY"):
+        raise ValueError("API key missing")
+
+    args = [audio_path]
+    if slides_path:
+        args += ["--slides", slides_path]
+    if pages:
+        args += ["--pages", pages]
+    if threads:
+        args += ["--threads", str(threads)]
+    if engine in ("pool", "batched"):
+        args += ["--engine", engine]
+    if resume_folder:
+        args += ["--resume"]
+
+    summary = f"threads={threads}, engine={engine or 'pool'}"
+    return args, os.path.basename(audio_path), summary
+
+
+class Job:
+    """One AudioTTo.main run with its own log buffer, listeners and cancel flag"""
+
+    def __init__(self, job_id, args, label):
+        self.id = job_id
+        self.args = args
+        self.label = label
+        self.status = "queued"
+        self.succeeded = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.logs = deque(maxlen=JOB_LOG_LINES)
+        self.progress = None
+        self.listeners = []
+        self.folder = os.path.splitext(label)[0]  # Output folder written by AudioTTo
+        self.cancel_event = threading.Event()
+        self.done = asyncio.Event()
+        self._lock = threading.Lock()
+
+    def emit(self, msg):
+        """Record a log line and forward it to the listeners (called from the job thread)"""
+        with self._lock:
+            self.logs.append(msg)
+            for listener in self.listeners:
+                listener.push_log(msg)
+
+    def set_progress(self, event):
+        """Merge a structured progress event (percent, real-time factor, ETA, bar) from the job thread"""
+        with self._lock:
+            self.progress = {**(self.progress or {}), **event}
+            for listener in self.listeners:
+                listener.push_progress(event)
+
+    def subscribe(self, listener):
+        """Replay the buffered lines and progress to a new EventChannel, then keep it attached"""
+        with self._lock:
+            for msg in self.logs:
+                listener.push_log(msg)
+            if self.progress:
+                listener.push_progress(self.progress)
+            self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def info(self, with_logs=False):
+        now = time.time()
+        queue_wait = (self.started_at or self.finished_at or now) - self.submitted_at
+        run_time = ((self.finished_at or now) - self.started_at) if self.started_at else 0.0
+        info = {
+            "id": self.id,
+            "label": self.label,
+            "status": self.status,
+            "args": self.args,
+            "submitted_at": self.submitted_at,
+            "queue_wait": round(queue_wait, 2),
+            "run_time": round(run_time, 2),
+            "progress": self.progress,
+            "error": self.error
+        }
+        if self.status == "queued":
+            info["queue_position"] = job_manager.queue_position(self)
+        if with_logs:
+            info["logs"] = list(self.logs)
+        return info
+
+
+class JobManager:
+    """FIFO job queue running at most max_concurrent jobs at once on the shared worker pool"""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max(1, max_concurrent)
+        self.jobs = OrderedDict()
+        self._slots = None
+
+    def submit(self, args, label):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = Job(uuid.uuid4().hex[:12], args, label)
+        self.jobs[job.id] = job
+        self._prune()
+        asyncio.create_task(self._run(job))
+        return job
+
+    async def _run(self, job):
+        async with self._slots:
+            if job.cancel_event.is_set():
+                job.status = "cancelled"
+            else:
+                job.status = "running"
+                job.started_at = time.time()
+                try:
+                    job.succeeded = await asyncio.to_thread(run_audiotto, job)
+                    if job.cancel_event.is_set():
+                        job.status = "cancelled"
+                    else:
+                        job.status = "done" if job.succeeded else "failed"
+                except Exception as e:
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.emit(f"❌ {e}")
+        job.finished_at = time.time()
+        if job.started_at is not None:
+            await asyncio.to_thread(output_catalog.update_folder, job.folder)
+        job.done.set()
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and job.status in ("queued", "running"):
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+        return job
+
+    def active_folders(self):
+        """Output folders of the jobs still queued or running (their manifests are not interrupted)"""
+        return {j.folder for j in list(self.jobs.values()) if j.status in ("queued", "running")}
+
+    def queue_position(self, job):
+        queued = [j for j in self.jobs.values() if j.status == "queued"]
+        return queued.index(job) + 1 if job in queued else 0
+
+    def _prune(self):
+        finished = [j.id for j in self.jobs.values() if j.finished_at is not None]
+        for job_id in finished[:max(0, len(self.jobs) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+
+job_manager = JobManager(MAX_CONCURRENT_JOBS)
+
+
+def run_audiotto(job):
+    # 🔥 LAZY IMPORT (CRITICO)
+    import AudioTTo
+
+    # Logger, cancel flag and progress are bound to this job only, concurrent jobs do not mix
+    with AudioTTo.job_context(logger=job.emit, cancel_event=job.cancel_event, progress=job.set_progress):
+        pool = get_pool()
+        fit_pool(pool, job_threads(job.args))
+        return AudioTTo.main(job.args, pool=pool)
+
+
+def job_threads(args):
+    """Thread budget requested by a job (--threads), None when it did not ask for one"""
+    if "--threads" not in args:
+        return None
+    return int(args[args.index("--threads") + 1])
+
+
+def fit_pool(pool, threads):
+    """Reshape the shared pool to a job's thread budget; a pool busy with other jobs keeps its layout"""
+    import AudioTTo
+    if not threads:
+        return
+    processes, cpu_threads = AudioTTo.resolve_topology(threads)
+    if not pool.resize_if_idle(processes, cpu_threads):
+        AudioTTo.log(f"⚠️ Worker pool busy with another job: keeping {pool.processes} processes x "
+                     f"{pool.cpu_threads} threads instead of {processes} x {cpu_threads}")
+
+
+async def follow_job(ws, job):
+    """Stream the events of a job to the websocket as JSON frames until the job ends"""
+    channel = EventChannel(asyncio.get_running_loop())
+    job.subscribe(channel)
+    if job.status == "queued":
+        await ws.send_json({"type": "status", "status": "queued", "position": job_manager.queue_position(job)})
+
+    async def wait_done():
+        await job.done.wait()
+        channel.ready.set()
+
+    watcher = asyncio.create_task(wait_done())
+    try:
+        while True:
+            if not job.done.is_set():
+                await channel.ready.wait()
+            finished = job.done.is_set()
+            if not finished:
+                # Let the frame fill up; the send below is awaited, so a slow client
+                # backs up into the bounded channel rather than into the event loop
+                await asyncio.sleep(WS_FRAME_SEC)
+            for event in channel.take():
+                await ws.send_json(event)
+            if finished:
+                break
+    finally:
+        watcher.cancel()
+        job.unsubscribe(channel)
+
+    info = job.info()
+    await ws.send_json({
+        "type": "status",
+        "status": job.status,
+        "queue_wait": info["queue_wait"],
+        "run_time": info["run_time"],
+        "error": info["error"]
+    })
+    await ws.send_json({"type": "refresh"})
+
+
+# Submit a job
+@app.post("/api/jobs", status_code=202)
+async def submit_job(data: dict = Body(...)):
+    try:
+        args, label, _ = await build_job_args(data)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    return job_manager.submit(args, label).info()
+
+
+# List jobs
+@app.get("/api/jobs")
+async def list_jobs():
+    return [job.info() for job in job_manager.jobs.values()]
+
+
+# Inspect a job (with its recent log lines)
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+    return job.info(with_logs=True)
+
+
+# Cancel a job
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Not found"})
+    return job.info()
 
 
 # ------------------------------------------------------------
@@ -214,39 +1060,20 @@ async def process_ws(ws: WebSocket):
     await ws.accept()
     try:
         data = await ws.receive_json()
-        audio = data.get("audio_filename")
-        slides = data.get("slides_filename")
-        pages = data.get("pages")
-        threads = data.get("threads")
-
-        if not audio:
-            await ws.send_text("❌ No audio file")
-            return
-
-        if not os.getenv("GEMINI_API_KEY"):
-            await ws.send_text("❌ API key missing")
+        try:
+            args, label, summary = await build_job_args(data)
+        except ValueError as e:
+            await ws.send_json({"type": "error", "message": str(e)})
             return
 
-        args = [os.path.join("temp_uploads", audio)]
-        if slides:
-            args += ["--slides", os.path.join("temp_uploads", slides)]
-        if pages:
-            args += ["--pages", pages]
-        if threads:
-            args += ["--threads", str(threads)]
-
-        await ws.send_text(f"🚀 Processing (threads={threads})")
-
-        loop = asyncio.get_running_loop()
-        await asyncio.to_thread(run_audiotto, args, loop, ws)
-
-        await ws.send_text("✅ Done")
-        await ws.send_text("REFRESH_OUTPUTS")
+        job = job_manager.submit(args, label)
+        await ws.send_json({"type": "log", "lines": [f"🚀 Processing ({summary})"]})
+        await follow_job(ws, job)
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        await ws.send_text(f"❌ Error: {e}")
+        await ws.send_json({"type": "error", "message": f"Error: {e}"})
     finally:
         try:
             await ws.close()
@@ -254,25 +1081,23 @@ async def process_ws(ws: WebSocket):
             pass
 
 
-def run_audiotto(args, loop, ws):
-    # 🔥 LAZY IMPORT (CRITICO)
-    import AudioTTo
-
-    def logger(msg):
-        async def send():
-            try:
-                await ws.send_text(msg)
-            except:
-                pass
-        asyncio.run_coroutine_threadsafe(send(), loop)
-
-    AudioTTo.set_logger(logger)
+# Follow a job submitted through the REST API
+@app.websocket("/ws/jobs/{job_id}")
+async def job_ws(ws: WebSocket, job_id: str):
+    await ws.accept()
     try:
-        AudioTTo.main(args)
-    except Exception as e:
-        logger(f"❌ {e}")
+        job = job_manager.get(job_id)
+        if job is None:
+            await ws.send_json({"type": "error", "message": "Job not found"})
+            return
+        await follow_job(ws, job)
+    except WebSocketDisconnect:
+        pass
     finally:
-        AudioTTo.set_logger(None)
+        try:
+            await ws.close()
+        except:
+            pass
 
 
 # ------------------------------------------------------------
@@ -325,14 +1150,9 @@ if __name__ == "__main__":
 
         try:
             while True:
-                import time
                 time.sleep(1)
         except KeyboardInterrupt:
             pass
 
     finally:
-        if os.path.exists("temp_uploads"):
-            try:
-                shutil.rmtree("temp_uploads")
-            except:
-                pass
+        cleanup_temp_uploads()
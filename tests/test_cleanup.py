@@ -0,0 +1,15 @@
+import os
+
+from AudioTTo import cleanup_output
+
+
+def test_cleanup_keeps_results_and_profiles(tmp_path):
+    kept = ["notes_appunti.tex", "notes_appunti.pdf", "notes_trascrizione.txt", "notes_timings.json",
+            "profile_pdf.prof", "profile_draft.prof"]
+    removed = ["notes_appunti.aux", "notes_appunti.log", "chunk_000.wav", "job.json"]
+    for name in kept + removed:
+        (tmp_path / name).write_text("x")
+
+    cleanup_output(str(tmp_path), "notes")
+
+    assert sorted(os.listdir(tmp_path)) == sorted(kept)
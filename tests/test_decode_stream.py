@@ -0,0 +1,46 @@
+import contextlib
+import shutil
+import wave
+
+import pytest
+
+import AudioTTo
+
+pytestmark = pytest.mark.skipif(shutil.which(AudioTTo.AudioSegment.converter or "ffmpeg") is None,
+                                reason="ffmpeg not available")
+
+
+def write_wav(path, seconds):
+    pcm = (AudioTTo.synthetic_speech(seconds) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(AudioTTo.SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+
+def test_decodes_every_sample(tmp_path):
+    path = tmp_path / "speech.wav"
+    write_wav(path, 12)
+    with contextlib.closing(AudioTTo.decode_audio_stream(str(path), 5)) as windows:
+        sizes = [len(window) for window in windows]
+    assert sizes == [5 * AudioTTo.SAMPLE_RATE, 5 * AudioTTo.SAMPLE_RATE, 2 * AudioTTo.SAMPLE_RATE]
+
+
+def test_early_stop_kills_ffmpeg_quietly(tmp_path, monkeypatch):
+    path = tmp_path / "speech.wav"
+    write_wav(path, 120)
+    procs = []
+    popen = AudioTTo.subprocess.Popen
+    monkeypatch.setattr(AudioTTo.subprocess, "Popen", lambda *a, **k: procs.append(popen(*a, **k)) or procs[-1])
+    lines = []
+
+    with AudioTTo.job_context(logger=lines.append):
+        with pytest.raises(AudioTTo.JobCancelled):
+            with contextlib.closing(AudioTTo.decode_audio_stream(str(path), 1)) as windows:
+                next(windows)
+                raise AudioTTo.JobCancelled()
+
+    assert procs[0].returncode is not None
+    assert procs[0].stdout.closed and procs[0].stderr.closed
+    assert not any("FFmpeg" in line for line in lines)
@@ -0,0 +1,36 @@
+from AudioTTo import merge_chunk_texts
+
+
+def test_repeated_overlap_is_removed():
+    texts = ["so the gradient points uphill and", "points uphill and we step the other way"]
+    assert merge_chunk_texts(texts) == "so the gradient points uphill and we step the other way"
+
+
+def test_cut_off_word_is_tolerated():
+    texts = ["the matrix is symmetric posit", "matrix is symmetric positive definite"]
+    assert merge_chunk_texts(texts) == "the matrix is symmetric positive definite"
+
+
+def test_seam_without_overlap_keeps_every_word():
+    texts = ["and that is the end of the day.", "Of the three methods, the first is the simplest."]
+    assert merge_chunk_texts(texts) == "and that is the end of the day. Of the three methods, the first is the simplest."
+
+
+def test_common_bigram_does_not_drop_tail_words():
+    texts = ["we saw it in the lab", "in the next lecture we will see why"]
+    assert merge_chunk_texts(texts) == "we saw it in the lab in the next lecture we will see why"
+
+
+def test_common_bigram_at_the_seam_is_kept():
+    texts = ["then we go to the", "to the next slide"]
+    assert merge_chunk_texts(texts) == "then we go to the to the next slide"
+
+
+def test_match_beyond_the_overlap_is_ignored():
+    texts = ["the first theorem says that every bounded sequence has a convergent subsequence",
+             "the first theorem is due to Bolzano"]
+    assert merge_chunk_texts(texts, overlap_sec=1.5).endswith("subsequence the first theorem is due to Bolzano")
+
+
+def test_empty_chunks():
+    assert merge_chunk_texts(["", "hello world", ""]) == "hello world"
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gui_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("temp_uploads")
+    gui_app.upload_sessions.clear()
+    gui_app.completed_uploads.clear()
+    yield TestClient(gui_app.app)
+    gui_app.upload_sessions.clear()
+    gui_app.completed_uploads.clear()
+
+
+def start_upload(client, transcode=False):
+    res = client.post("/api/uploads", json={"filename": "lecture.mp3", "size": 1000, "key": "1", "transcode": transcode})
+    session = res.json()
+    res = client.put(f"/api/uploads/{session['upload_id']}?offset=0", content=b"\xff" * 100)
+    assert res.status_code == 200
+    return gui_app.upload_sessions[session["upload_id"]]
+
+
+def test_delete_discards_the_upload(client):
+    session = start_upload(client)
+    assert os.path.exists(session.part_path)
+
+    assert client.delete(f"/api/uploads/{session.id}").status_code == 200
+    assert session.id not in gui_app.upload_sessions
+    assert not os.path.exists(session.part_path)
+    assert client.delete(f"/api/uploads/{session.id}").status_code == 404
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not available")
+def test_idle_upload_expires_and_stops_the_transcoder(client):
+    session = start_upload(client, transcode=True)
+    assert session.transcoder is not None and session.transcoder.proc.poll() is None
+
+    asyncio.run(gui_app.expire_upload_sessions(idle_sec=3600))
+    assert session.id in gui_app.upload_sessions
+
+    session.touched -= 7200
+    asyncio.run(gui_app.expire_upload_sessions(idle_sec=3600))
+    assert session.id not in gui_app.upload_sessions
+    assert session.transcoder.proc.poll() is not None
+    assert os.listdir("temp_uploads") == []
+
+
+def test_repeat_upload_is_answered_before_the_transfer(client):
+    start = {"filename": "slides.pdf", "size": 100, "key": "1700000000000", "transcode": False}
+    session = client.post("/api/uploads", json=start).json()
+    client.put(f"/api/uploads/{session['upload_id']}?offset=0", content=b"%PDF" + b"x" * 96)
+    first = client.post(f"/api/uploads/{session['upload_id']}/complete").json()
+    assert first["complete"] and not first["deduplicated"]
+
+    again = client.post("/api/uploads", json=start).json()
+    assert again == {"complete": True, "filename": first["filename"], "deduplicated": True}
+
+    # A different file (another modification time) goes through a normal transfer
+    other = client.post("/api/uploads", json={**start, "key": "1700000000001"}).json()
+    assert other["complete"] is False and other["offset"] == 0
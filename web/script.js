@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const pdfInput = document.getElementById('pdf-input');
     const startBtn = document.getElementById('start-btn');
     const pagesInput = document.getElementById('pages-input');
+    const engineSelect = document.getElementById('engine-select');
     const terminalWindow = document.getElementById('terminal-window');
     const statusIndicator = document.getElementById('status-indicator');
     const resultsList = document.getElementById('results-list');
@@ -164,9 +165,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const threadsSlider = document.getElementById('threads-slider');
     const threadsDisplay = document.getElementById('threads-value-display');
     const maxCpuDisplay = document.getElementById('max-cpu-display');
+    const topologyDisplay = document.getElementById('topology-display');
+    const calibrateBtn = document.getElementById('calibrate-btn');
 
     let currentThreads = 4;
 
+    function showTopology(topology) {
+        if (!topology || !topologyDisplay) return;
+        topologyDisplay.textContent = `Layout (${topology.source}): ${topology.processes} worker processes × ${topology.cpu_threads} threads on ${topology.physical_cores} physical cores`;
+    }
+
     function openThreadsModal() {
         threadsModal.classList.remove('hidden');
     }
@@ -209,6 +217,8 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             if (res.ok) {
                 currentThreads = val;
+                const data = await res.json();
+                showTopology(data.topology);
                 showToast(`Threads set to ${val}`, 'success');
                 closeThreadsModal();
             } else {
@@ -223,6 +233,27 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    if (calibrateBtn) {
+        calibrateBtn.addEventListener('click', async () => {
+            calibrateBtn.disabled = true;
+            calibrateBtn.textContent = 'Calibrating...';
+
+            try {
+                const res = await fetch('/api/calibrate', { method: 'POST' });
+                if (!res.ok) throw new Error('Calibration failed');
+                const data = await res.json();
+                showToast(`Best layout: ${data.best.processes} × ${data.best.cpu_threads} threads`, 'success');
+                initThreadsInfo();
+            } catch (e) {
+                console.error(e);
+                showToast('Calibration failed', 'error');
+            } finally {
+                calibrateBtn.disabled = false;
+                calibrateBtn.textContent = 'Calibrate';
+            }
+        });
+    }
+
     async function initThreadsInfo() {
         try {
             const res = await fetch('/api/info');
@@ -240,6 +271,7 @@ document.addEventListener('DOMContentLoaded', () => {
             maxCpuDisplay.textContent = maxThreads;
             threadsDisplay.textContent = threadsSlider.value;
             currentThreads = parseInt(threadsSlider.value);
+            showTopology(data.topology);
 
         } catch (e) {
             console.error("Failed to fetch app info:", e);
@@ -325,13 +357,60 @@ document.addEventListener('DOMContentLoaded', () => {
         pdfFile = file;
         document.getElementById('pdf-file-info').textContent = `Selected file: ${file.name}`;
         pagesInput.disabled = false;
-        pagesInput.placeholder = "e.g., 1-5 (Optional)";
+        pagesInput.placeholder = "e.g., 1-5,9,12-14 (Optional)";
     });
 
     function checkStartReady() {
         startBtn.disabled = !audioFile;
     }
 
+    // --- Chunked Upload ---
+    const UPLOAD_RETRIES = 5;
+
+    async function uploadFile(file, transcode) {
+        const startRes = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                key: `${file.lastModified}`,
+                transcode: transcode
+            })
+        });
+        if (!startRes.ok) throw new Error(`Upload error (${file.name})`);
+        let session = await startRes.json();
+        if (session.complete) return session;
+
+        if (session.offset > 0) log(`Resuming upload of ${file.name} from ${Math.round(session.offset / file.size * 100)}%`);
+
+        let retries = 0;
+        while (session.offset < file.size) {
+            const end = Math.min(session.offset + session.chunk_size, file.size);
+            try {
+                const res = await fetch(`/api/uploads/${session.upload_id}?offset=${session.offset}`, {
+                    method: 'PUT',
+                    body: file.slice(session.offset, end)
+                });
+                // 409: the server has a different offset, continue from there
+                if (!res.ok && res.status !== 409) throw new Error(`HTTP ${res.status}`);
+                session = await res.json();
+                retries = 0;
+                statusIndicator.textContent = `Uploading ${file.name} ${Math.round(session.offset / file.size * 100)}%`;
+            } catch (err) {
+                if (++retries > UPLOAD_RETRIES) throw new Error(`Upload error (${file.name}): ${err.message}`);
+                log(`⚠️ Upload interrupted, retrying (${retries}/${UPLOAD_RETRIES})...`);
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                const statusRes = await fetch(`/api/uploads/${session.upload_id}`).catch(() => null);
+                if (statusRes && statusRes.ok) session = await statusRes.json();
+            }
+        }
+
+        const doneRes = await fetch(`/api/uploads/${session.upload_id}/complete`, { method: 'POST' });
+        if (!doneRes.ok) throw new Error(`Upload error (${file.name})`);
+        return await doneRes.json();
+    }
+
     // --- Upload & Process Logic ---
     startBtn.addEventListener('click', async () => {
         if (!audioFile) return;
@@ -350,28 +429,26 @@ document.addEventListener('DOMContentLoaded', () => {
         log("Starting file upload...");
 
         try {
-            // 1. Upload Audio
-            const audioData = new FormData();
-            audioData.append('file', audioFile);
-            const audioRes = await fetch('/upload', { method: 'POST', body: audioData });
-            if (!audioRes.ok) throw new Error("Audio upload error");
-            const audioJson = await audioRes.json();
-            log(`Audio uploaded: ${audioJson.filename}`);
+            // 1. Upload Audio (transcoded to 16kHz WAV while it uploads, when the format allows it)
+            const audioJson = await uploadFile(audioFile, true);
+            log(`Audio uploaded: ${audioJson.filename}${audioJson.deduplicated ? ' (already on the server)' : ''}`);
 
             // 2. Upload PDF (if any)
             let pdfFilename = null;
             if (pdfFile) {
-                const pdfData = new FormData();
-                pdfData.append('file', pdfFile);
-                const pdfRes = await fetch('/upload', { method: 'POST', body: pdfData });
-                if (!pdfRes.ok) throw new Error("PDF upload error");
-                const pdfJson = await pdfRes.json();
+                const pdfJson = await uploadFile(pdfFile, false);
                 pdfFilename = pdfJson.filename;
                 log(`PDF uploaded: ${pdfFilename}`);
             }
 
             // 3. Connect WebSocket & Start Process
-            startWebSocket(audioJson.filename, pdfFilename, pagesInput.value);
+            startWebSocket({
+                audio_filename: audioJson.filename,
+                slides_filename: pdfFilename,
+                pages: pagesInput.value,
+                threads: currentThreads,
+                engine: engineSelect.value
+            });
 
         } catch (err) {
             log(`❌ Errore: ${err.message}`);
@@ -381,7 +458,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    function startWebSocket(audioName, pdfName, pages) {
+    function startWebSocket(config) {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         ws = new WebSocket(`${protocol}//${window.location.host}/ws/process`);
 
@@ -390,35 +467,48 @@ document.addEventListener('DOMContentLoaded', () => {
             statusIndicator.style.color = '#3b82f6'; // Blue
 
             // Send config to start
-            ws.send(JSON.stringify({
-                audio_filename: audioName,
-                slides_filename: pdfName,
-                pages: pages,
-                threads: currentThreads
-            }));
+            ws.send(JSON.stringify(config));
         };
 
         ws.onmessage = (event) => {
-            const msg = event.data;
-            if (msg === 'REFRESH_OUTPUTS') {
-                loadOutputs();
-                statusIndicator.textContent = 'Completed';
-                statusIndicator.style.color = '#10b981'; // Green
-                startBtn.disabled = true; // Keep disabled until new file is selected
-
-                // Reset inputs
-                audioFile = null;
-                pdfFile = null;
-                audioInput.value = '';
-                pdfInput.value = '';
-                pagesInput.value = '';
-                pagesInput.disabled = true; // Disable again until new PDF
-                document.getElementById('audio-file-info').textContent = '';
-                document.getElementById('pdf-file-info').textContent = '';
-
-                log("Inputs cleared. Ready for new task.");
-            } else {
-                log(msg);
+            const msg = JSON.parse(event.data);
+            switch (msg.type) {
+                case 'log':
+                    msg.lines.forEach(line => log(line));
+                    break;
+                case 'dropped':
+                    log(`… ${msg.count} log lines skipped`);
+                    break;
+                case 'progress':
+                    showProgress(msg);
+                    break;
+                case 'status':
+                    showStatus(msg);
+                    break;
+                case 'error':
+                    log(`❌ ${msg.message}`);
+                    statusIndicator.textContent = 'Error';
+                    statusIndicator.style.color = '#ef4444';
+                    break;
+                case 'refresh':
+                    progressLine = null;
+                    loadOutputs();
+                    statusIndicator.textContent = 'Completed';
+                    statusIndicator.style.color = '#10b981'; // Green
+                    startBtn.disabled = true; // Keep disabled until new file is selected
+
+                    // Reset inputs
+                    audioFile = null;
+                    pdfFile = null;
+                    audioInput.value = '';
+                    pdfInput.value = '';
+                    pagesInput.value = '';
+                    pagesInput.disabled = true; // Disable again until new PDF
+                    document.getElementById('audio-file-info').textContent = '';
+                    document.getElementById('pdf-file-info').textContent = '';
+
+                    log("Inputs cleared. Ready for new task.");
+                    break;
             }
         };
 
@@ -435,6 +525,47 @@ document.addEventListener('DOMContentLoaded', () => {
         };
     }
 
+    // Single terminal line rewritten in place by progress events
+    let progressLine = null;
+
+    function formatSeconds(sec) {
+        sec = Math.round(sec);
+        return sec >= 60 ? `${Math.floor(sec / 60)}m ${sec % 60}s` : `${sec}s`;
+    }
+
+    function showProgress(msg) {
+        const terminalWindow = document.getElementById('terminal-window');
+        if (!progressLine) {
+            progressLine = document.createElement('div');
+            progressLine.className = 'log-line';
+            terminalWindow.appendChild(progressLine);
+        }
+        let text = msg.bar || `${msg.stage}: ${msg.percent}%`;
+        if (msg.rtf) text += ` · ${msg.rtf}x real time`;
+        if (msg.eta_sec != null) text += ` · ETA ${formatSeconds(msg.eta_sec)}`;
+        progressLine.textContent = `> ${text}`;
+        if (msg.percent != null) {
+            statusIndicator.textContent = `Elaboration in progress... ${Math.floor(msg.percent)}%`;
+        }
+        terminalWindow.scrollTop = terminalWindow.scrollHeight;
+    }
+
+    function showStatus(msg) {
+        if (msg.status === 'queued') {
+            log(`⏳ Queued (position ${msg.position})`);
+            statusIndicator.textContent = 'Queued';
+            return;
+        }
+        log(`⏱️ Queue wait ${formatSeconds(msg.queue_wait)}, run time ${formatSeconds(msg.run_time)}`);
+        if (msg.status === 'done') {
+            log("✅ Done");
+        } else if (msg.status === 'cancelled') {
+            log("🛑 Cancelled");
+        } else {
+            log(msg.error ? `❌ Failed: ${msg.error}` : "❌ Failed");
+        }
+    }
+
     function log(message) {
         const terminalWindow = document.getElementById('terminal-window');
 
@@ -459,29 +590,89 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- Results Logic ---
-    async function loadOutputs() {
+    const OUTPUTS_PAGE = 50;
+    let outputsLoaded = 0;
+
+    function outputItem(file) {
+        const item = document.createElement('div');
+        item.className = 'result-item';
+        item.innerHTML = `
+            <h4>${file.folder}</h4>
+            <p>${file.filename}</p>
+            <a href="/view/${file.folder}/${file.filename}" class="download-btn" target="_blank">Open PDF</a>
+        `;
+        return item;
+    }
+
+    async function loadOutputs(more = false) {
         try {
-            const res = await fetch('/outputs');
+            const offset = more ? outputsLoaded : 0;
+            const res = await fetch(`/outputs?sort=date&offset=${offset}&limit=${OUTPUTS_PAGE}`);
             const files = await res.json();
+            const total = parseInt(res.headers.get('X-Total-Count') || files.length, 10);
+
+            let moreBtn = document.getElementById('load-more-outputs');
+            if (!more) {
+                resultsList.innerHTML = '';
+                outputsLoaded = 0;
+                moreBtn = null;
+                if (files.length === 0) {
+                    resultsList.innerHTML = '<div class="empty-state">No notes generated.</div>';
+                }
+            }
+
+            files.forEach(file => resultsList.insertBefore(outputItem(file), moreBtn));
+            outputsLoaded += files.length;
 
-            resultsList.innerHTML = '';
-            if (files.length === 0) {
-                resultsList.innerHTML = '<div class="empty-state">No notes generated.</div>';
-                return;
+            if (outputsLoaded < total && !moreBtn) {
+                moreBtn = document.createElement('button');
+                moreBtn.id = 'load-more-outputs';
+                moreBtn.className = 'download-btn';
+                moreBtn.addEventListener('click', () => loadOutputs(true));
+                resultsList.appendChild(moreBtn);
             }
+            if (moreBtn) {
+                if (outputsLoaded < total) {
+                    moreBtn.textContent = `Load more (${total - outputsLoaded})`;
+                } else {
+                    moreBtn.remove();
+                }
+            }
+        } catch (err) {
+            console.error("Errore caricamento output:", err);
+        }
 
-            files.forEach(file => {
+        if (!more) loadResumable();
+    }
+
+    // --- Interrupted Jobs Logic ---
+    async function loadResumable() {
+        try {
+            const res = await fetch('/api/resumable');
+            const jobs = await res.json();
+
+            jobs.forEach(job => {
                 const item = document.createElement('div');
                 item.className = 'result-item';
                 item.innerHTML = `
-                    <h4>${file.folder}</h4>
-                    <p>${file.filename}</p>
-                    <a href="/view/${file.folder}/${file.filename}" class="download-btn" target="_blank">Open PDF</a>
+                    <h4>${job.folder}</h4>
+                    <p>Interrupted (${job.chunks_done} chunks, ${job.stages.join(', ') || 'no stage'} done)</p>
+                    <a href="#" class="download-btn">Resume</a>
                 `;
+                item.querySelector('a').addEventListener('click', (e) => {
+                    e.preventDefault();
+                    if (ws && ws.readyState === WebSocket.OPEN) {
+                        showToast('A job is already running.', 'error');
+                        return;
+                    }
+                    startBtn.disabled = true;
+                    log(`Resuming ${job.folder}...`);
+                    startWebSocket({ resume_folder: job.folder, threads: currentThreads });
+                });
                 resultsList.appendChild(item);
             });
         } catch (err) {
-            console.error("Errore caricamento output:", err);
+            console.error("Error loading interrupted jobs:", err);
         }
     }
 